@@ -2,293 +2,324 @@ from __future__ import absolute_import, division, print_function
 
 import math
 from math import sqrt, log
-from game import Game, WHITE, BLACK, GRID_COUNT, EMPTY
+from game import Game, WHITE, BLACK, EMPTY, ROLLOUT_RNG_MAX
+from heuristic import Heuristic, other_color
+try:
+    # Same lines and score as Heuristic, with the full-board scan done in NumPy
+    from numpy_eval import NumpyHeuristic as RootHeuristic
+    from numpy_eval import evaluate
+except ImportError:
+    RootHeuristic = Heuristic
+    evaluate = None
+from transposition import TranspositionTable, TT_CAPACITY
+from threats import ThreatSearch
 import copy
 import time
 import random
+import multiprocessing
 
 class Node:
-    # NOTE: modifying this block is not recommended
-    def __init__(self, state, actions, parent=None):
-        self.state = (state[0], copy.deepcopy(state[1]))
+    # Nodes only store the move that led to them and their statistics. The board
+    # lives in AI.simulator, which the search keeps at the state of the node it
+    # is visiting by pushing and popping moves.
+    __slots__ = ['action', 'player', 'num_wins', 'num_visits', 'parent', 'children',
+                 'is_terminal', 'proven', 'heuristic', 'prior', 'untried_actions', 'amaf']
+
+    def __init__(self, simulator, parent=None, action=None):
+        self.action = action #action that led from the parent to this node
+        self.player = simulator.player #player to move at this node
         self.num_wins = 0 #number of wins at the node
         self.num_visits = 0 #number of visits of the node
         self.parent = parent #parent node of the current node
         self.children = [] #store actions and children nodes in the tree as (action, node) tuples
-        self.simulator = Game(*state)
-        self.is_terminal = self.simulator.game_over
-        self.heuristic = Heuristic(self.simulator)
-        self.untried_actions = self.get_possible_actions(copy.deepcopy(actions)) #store actions that have not been tried
+        self.is_terminal = simulator.game_over
+        self.proven = simulator.winner if simulator.game_over else None #color that wins from here with best play, if known
 
-    def get_possible_actions(self, actions):
-        color = self.state[0]
-
-        # Check for forced wins
-        for dir in DIRS:
-            for line in self.heuristic.lines[dir][color]:
-                if line.num_consecutive == 4:
-                    return [line.get_open_ends()[0]]
+        if parent is not None:
+            # simulator already has action on it, play it on a copy-on-write
+            # version of the parent's heuristic instead of rescanning the board
+            self.heuristic = Heuristic.create_from_heuristic(parent.heuristic, simulator)
+            self.heuristic.place(*action)
+        else:
+            self.heuristic = RootHeuristic(simulator)
 
-        # TODO: Only return forced wins / forced defenses
-        forced_defenses = []
-        for dir in DIRS:
-            for line in self.heuristic.lines[dir][other_color(color)]:
-                if line.num_consecutive == 4:
-                    forced_defenses += line.get_open_ends()
+        # The only thing best_child needs from the heuristic: the value of the
+        # node for the player who moved into it. The heuristic itself is only
+        # kept until every child has been expanded from it.
+        self.prior = self.heuristic.get_value_for_player(other_color(self.player))
 
-        if len(forced_defenses) > 0:
-            return forced_defenses
+        self.untried_actions = self.get_possible_actions(list(simulator.get_actions())) #store actions that have not been tried
+        self.amaf = {} #[wins, visits] for the player of this node of every action it played later in a simulation, see update_amaf
 
-        return actions
+    def get_possible_actions(self, actions):
+        return self.heuristic.get_possible_actions(actions)
 
 # NOTE: deterministic_test() requires BUDGET = 1000
 # You can try higher or lower values to see how the AI's strength changes
 BUDGET = 2500
 
-#[(0, 0), (0, 1), ..., (0, GRID_COUNT-1)]
-STARTING_HOR = set(((0, i) for i in range(GRID_COUNT)))
-
-#[(0, 0), (1, 0), ..., (GRID_COUNT-1, 0)]
-STARTING_VER = set((i, 0) for i in range(GRID_COUNT))
-
-STARTING_DIAG_DOWN_RIGHT = STARTING_HOR.union(STARTING_VER)
-
-STARTING_DIAG_UP_RIGHT = STARTING_HOR.union(set((i, GRID_COUNT-1) for i in range(GRID_COUNT)))
-
-DIR_HOR = 0
-DIR_VER = 1
-DIR_DIAG_DOWN_RIGHT = 2
-DIR_DIAG_UP_RIGHT = 3
-
-DIRS = [DIR_HOR, DIR_VER, DIR_DIAG_DOWN_RIGHT, DIR_DIAG_UP_RIGHT]
-COLORS = [BLACK, WHITE]
-
-DIR_TO_DELTA = {
-    DIR_HOR: (1, 0),
-    DIR_VER: (0, 1),
-    DIR_DIAG_DOWN_RIGHT: (1, 1),
-    DIR_DIAG_UP_RIGHT: (1, -1)
-}
-
-DIR_TO_STARTING = {
-    DIR_HOR: STARTING_HOR,
-    DIR_VER: STARTING_VER,
-    DIR_DIAG_DOWN_RIGHT: STARTING_DIAG_DOWN_RIGHT,
-    DIR_DIAG_UP_RIGHT: STARTING_DIAG_UP_RIGHT
-}
-
-class ConsecutiveLine:
-    def __init__(self, start, end, start_open_end, end_open_end, dir, color, num_consecutive):
-        self.start = start
-        self.end = end
-        self.start_open_end = start_open_end
-        self.end_open_end = end_open_end
-        self.dir = dir
-        self.color = color
-        self.cached_score = math.inf
-
-        self.num_consecutive = num_consecutive
-        self.num_open_ends = len(self.get_open_ends())
-
-    def get_open_ends(self):
-        dx, dy = DIR_TO_DELTA[self.dir]
-        res = []
-        if self.start_open_end:
-            res.append((self.start[0] - dx, self.start[1] - dy))
-
-        if self.end_open_end:
-            res.append((self.end[0] + dx, self.end[1] + dy))
-
-        return res
-
-    def is_starting_end(self, x, y):
-        dx, dy = DIR_TO_DELTA[self.dir]
-        return self.start_open_end and (self.start[0] - dx, self.start[1] - dy) == (x, y)
-
-    def _calc_score(self, current_turn):
-        if self.num_consecutive > 4:
-            return 200000000
-        elif self.num_consecutive == 4:
-            if self.num_open_ends == 1:
-                if current_turn:
-                    return 100000000
-                return 50
-            elif self.num_open_ends == 2:
-                if current_turn:
-                    return 100000000
-                return 500000
-        elif self.num_consecutive == 3:
-            if self.num_open_ends == 1:
-                if current_turn:
-                    return 7
-                return 5
-            elif self.num_open_ends == 2:
-                if current_turn:
-                    return 10000
-                return 50
-        elif self.num_consecutive == 2:
-            if self.num_open_ends == 1:
-                return 2
-            else:
-                return 5
-        elif self.num_consecutive == 1:
-            if self.num_open_ends == 1:
-                return 0.5
-            else:
-                return 1
-        #raise ValueError('We should never reach this')
-
-    def score(self, this_turn_color):
-        # if self.num_open_ends == 0 and self.num_consecutive < 5:
-        #     raise ValueError("We shouldn't store consecutive useless lines without open ends")
-
-        current_turn = self.color == this_turn_color
-
-        self.cached_score = self._calc_score(current_turn)
-        return self.cached_score
-
-    def get_open_start(self):
-        dx, dy = DIR_TO_DELTA[self.dir]
-
-        # if not self.start_open_end:
-        #     ValueError('There is no open start')
-        return self.start[0] - dx, self.start[1] - dy
-
-    def get_open_end(self):
-        dx, dy = DIR_TO_DELTA[self.dir]
-
-        # if not self.end_open_end:
-        #     ValueError('There is no open end')
-        return self.end[0] + dx, self.end[1] + dy
-
-
-def other_color(color):
-    if color == BLACK:
-        return WHITE
-    return BLACK
-
+# With progressive widening a node with N visits has at most
+# ceil(WIDENING_COEFFICIENT * N ** WIDENING_EXPONENT) children
+WIDENING_COEFFICIENT = 1.0
+WIDENING_EXPONENT = 0.5
+
+# Limits of the threat search for a forced win: VCT at the root once per
+# move, VCF at every node when it is first expanded
+ROOT_THREAT_NODES = 1000
+ROOT_THREAT_TIME = 0.1
+NODE_THREAT_NODES = 50
+NODE_THREAT_TIME = 0.01
+
+# mcts_search looks at the clock once every this many iterations when given a deadline
+DEADLINE_CHECK_INTERVAL = 16
+
+# With early stopping, mcts_search also checks every DEADLINE_CHECK_INTERVAL
+# iterations whether the answer can still change. The most visited child
+# counts as out of reach once it leads the runner-up by more than
+# EARLY_STOP_FRACTION of the visits left: overtaking it would take the
+# runner-up winning more than (1 + EARLY_STOP_FRACTION) / 2 of them, while
+# UCB keeps sending visits to the leader. Values count as separated once
+# Hoeffding intervals on the win rates at confidence 1 - EARLY_STOP_DELTA no
+# longer overlap, and only after the root has EARLY_STOP_MIN_VISITS visits.
+EARLY_STOP_FRACTION = 0.3
+EARLY_STOP_DELTA = 0.05
+EARLY_STOP_MIN_VISITS = 100
+
+# Heuristic value that a truncated rollout maps to a 73% win probability
+# (a logistic with this scale). An open three of the player to move is worth
+# 10000, quiet positions differ by a few dozen.
+ROLLOUT_EVAL_SCALE = 20
+
+# With RAVE, best_child weighs a child's AMAF win rate by
+# sqrt(RAVE_EQUIVALENCE / (3 * N + RAVE_EQUIVALENCE)) for a child with N
+# visits, so the AMAF value counts for half at RAVE_EQUIVALENCE visits
+RAVE_EQUIVALENCE = 1000
+
+# ponder() searches in chunks of PONDER_ITERS iterations, checking between
+# them whether to stop, and stops by itself once the root has
+# PONDER_MAX_VISITS visits to keep the tree's memory bounded. Every
+# iteration adds about one node, so this stops pondering before the
+# transposition table fills up and starts evicting.
+PONDER_ITERS = 16
+PONDER_MAX_VISITS = TT_CAPACITY
+
+# Number of processes the parallel searches run in
+NUM_WORKERS = multiprocessing.cpu_count()
+
+# Leaves leaf_parallel_search selects per step, and the visits without wins
+# it adds along each of their paths until the rollout result comes back
+LEAF_BATCH_SIZE = 8
+VIRTUAL_LOSS = 1
+
+def seeded_ai(ai_class, state, settings, seed):
+    # Worker processes start with copies of the same random state, so each
+    # job gets its own seed for random and for the Game's rollout_rng.
+    # settings, from AI.settings(), carries the flags set on the instance.
+    random.seed(seed)
+    ai_player = ai_class(state)
+    for name, value in settings.items():
+        setattr(ai_player, name, value)
+    ai_player.simulator.rollout_rng = seed % ROLLOUT_RNG_MAX
+    return ai_player
+
+def search_worker(ai_class, state, settings, budget, seed):
+    # Runs in a worker process of root_parallel_search: one independent
+    # search, returning the root statistics to merge and the forced win
+    # the worker's threat search found, if any
+    ai_player = seeded_ai(ai_class, state, settings, seed)
+    ai_player.mcts_search(budget)
+
+    root = ai_player.root
+    child_stats = [(action, child.num_wins, child.num_visits) for action, child in root.children]
+    return root.num_visits, child_stats, ai_player.root_win
+
+def rollout_worker(ai_class, state, settings, seed):
+    # Runs in a worker process of leaf_parallel_search: one rollout from state
+    ai_player = seeded_ai(ai_class, state, settings, seed)
+    return ai_player.rollout(ai_player.root)
 
-class Heuristic:
-    def __init__(self, simulator):
-        self.simulator = simulator
-        self.score = {BLACK: 0, WHITE: 0}
-        self.lines = {}
-        self.open_end_dicts = {}
-        self.reset()
-
-    def reset(self):
-        # Construct list of consecutive stones of a color and open ends
-        for dir in DIRS:
-            self.lines[dir] = {}
-            self.open_end_dicts[dir] = {}
-            for color in COLORS:
-                discovered_lines, open_ends_dict = self.find_consecutive_dir(color, dir)
-                self.lines[dir][color] = discovered_lines
-                self.open_end_dicts[dir][color] = open_ends_dict
-
-    def find_consecutive_dir(self, color, dir):
-
-        starting = DIR_TO_STARTING[dir]
-        dx, dy = DIR_TO_DELTA[dir]
-
-        grid = self.simulator.state()[1]
-        count_consecutive = 0
+class AI:
+    # Number of playouts one rollout() result stands for, backpropagate counts
+    # each of them as a visit
+    playouts_per_rollout = 1
 
-        discovered_lines = []
-        open_ends_dict = {}
+    # Whether move orders reaching the same position share one node
+    use_transpositions = True
 
-        starting_open_end = False
-        start_coords = None
-        end_coords = None
+    # Whether nodes drop their Heuristic when not expanding, see release_heuristic
+    release_heuristics = True
 
-        def add_line(is_ending_open_end):
-            # Do not record, this is a dead line, won't ever be useful
-            if count_consecutive < 5 and not starting_open_end and not is_ending_open_end:
-                return
+    # Whether to expand the moves the heuristic rates best first, unlocking
+    # them as visits grow, instead of in get_actions() order one after another
+    # (which deterministic_test() needs)
+    progressive_widening = False
 
-            line = ConsecutiveLine(start_coords, end_coords, starting_open_end, is_ending_open_end, dir, color, count_consecutive)
-            discovered_lines.append(line)
+    # Whether to look for forced wins with the threat solver, see forced_win
+    threat_search = True
 
-            # Add open ends to open end map
-            open_ends = line.get_open_ends()
-            for open_end in open_ends:
-                if open_end not in open_ends_dict:
-                    open_ends_dict[open_end] = [line]
-                else:
-                    open_ends_dict[open_end].append(line)
-
-            # Add score
-            self.score[color] += line.score(self.simulator.state()[0])
-
-        def is_within_bounds(x, y):
-            return 0 <= x < GRID_COUNT and 0 <= y < GRID_COUNT
-
-        for sx, sy in starting:
-            x, y = sx, sy
-
-            while is_within_bounds(x, y):
-                # Do a linear pass starting at sx, sy and incrementing by dx, dy
-                if grid[x][y] == color:
-                    if count_consecutive == 0:
-                        start_coords = (x, y)
-                    count_consecutive += 1
-                elif grid[x][y] == EMPTY and count_consecutive > 0:
-                    end_coords = (x-dx, y-dy)
-                    add_line(True)
-                    count_consecutive = 0
-
-                    starting_open_end = True
-                elif grid[x][y] == EMPTY:
-                    starting_open_end = True
-                elif count_consecutive > 0:
-                    end_coords = (x-dx, y-dy)
-                    add_line(False)
-                    count_consecutive = 0
-                    starting_open_end = False
-                else:
-                    starting_open_end = False
-                x += dx
-                y += dy
+    # Whether to prove nodes won or lost and search around them, see prove
+    mcts_solver = True
 
-            if count_consecutive > 0:
-                end_coords = (x - dx, y - dy)
-                add_line(False)
+    # Whether mcts_search may stop before its budget once the move it would
+    # return is settled, see early_stop
+    early_stopping = False
 
-            count_consecutive = 0
-            starting_open_end = False
+    # Plies a rollout plays before it stops and scores the position with the
+    # heuristic instead, None to always play to the end, see rollout
+    rollout_depth = None
 
-        return discovered_lines, open_ends_dict
+    # Whether best_child blends in all-moves-as-first statistics, see
+    # update_amaf. Only mcts_search collects them.
+    use_rave = False
 
-    def get_value_for_player(self, color):
-        return self.score[color] - self.score[other_color(color)]
+    # The flags above and those subclasses add, which the parallel searches
+    # hand to their workers with settings()
+    SETTINGS = ['playouts_per_rollout', 'use_transpositions', 'release_heuristics',
+                'progressive_widening', 'threat_search', 'mcts_solver', 'early_stopping',
+                'rollout_depth', 'use_rave']
 
-class AI:
     # NOTE: modifying this block is not recommended because it affects the random number sequences
     def __init__(self, state):
         self.simulator = Game()
         self.simulator.reset(*state) #using * to unpack the state tuple
-        self.root = Node(state, self.simulator.get_actions())
+        self.root = Node(self.simulator)
+        self.table = TranspositionTable()
+        self.table.put(self.simulator.hash, self.root)
+        self.solved_root = None # root the last solve_root() result is for
+        self.root_win = None
+
+    def get_budget(self):
+        return BUDGET
+
+    def settings(self):
+        return {name: getattr(self, name) for name in self.SETTINGS}
+
+    def advance(self, action):
+        # Plays action on the root state and keeps searching from there: the
+        # child it leads to becomes the root with the statistics it already
+        # has, or a fresh root if it was never expanded. Returns the number of
+        # visits the new root inherits, or None without changing anything if
+        # action is not legal at the root.
+        children = dict(self.root.children)
+        if not self.simulator.place(*action):
+            return None
+
+        if action in children:
+            self.root = children[action]
+        else:
+            self.root = self.table.get(self.simulator.hash)
+            if self.root is None:
+                self.root = Node(self.simulator)
+                self.table.put(self.simulator.hash, self.root)
+        self.root.parent = None
+
+        return self.root.num_visits
+
+    def follow(self, state):
+        # Advances through the moves that lead from the root to state, found by
+        # comparing the grids, so that after the AI's move and the reply the
+        # grandchild becomes the root. Starts over from state when it doesn't
+        # follow from the root. Returns the number of visits inherited.
+        player, grid = state
+        new_stones = {BLACK: [], WHITE: []}
+        for r in range(len(grid)):
+            for c in range(len(grid[r])):
+                if self.simulator.grid[r][c] != grid[r][c]:
+                    if self.simulator.grid[r][c] != EMPTY:
+                        new_stones = None
+                        break
+                    new_stones[grid[r][c]].append((r, c))
+            if new_stones is None:
+                break
+
+        if new_stones is not None:
+            # Colors alternate starting with the player to move at the root
+            mover = self.simulator.player
+            moves = []
+            while len(new_stones[mover]) > 0:
+                moves.append(new_stones[mover].pop())
+                mover = other_color(mover)
+
+            if len(new_stones[BLACK]) + len(new_stones[WHITE]) == 0 and mover == player:
+                # The order the stones are replayed in is a guess, a move can
+                # come before the stone that made it legal. Anything that
+                # doesn't end at state exactly starts over.
+                for action in moves:
+                    if self.advance(action) is None:
+                        break
+                else:
+                    if self.simulator.grid == grid and self.simulator.player == player:
+                        return self.root.num_visits
+
+        self.simulator.reset(*state)
+        self.root = Node(self.simulator)
+        self.table.put(self.simulator.hash, self.root)
+        return 0
 
-    def mcts_search(self):
+    def mcts_search(self, max_iters=None, deadline=None):
 
         #TODO: Implement the main MCTS loop
 
+        # Searches until max_iters iterations have run or time.time() reaches
+        # deadline, whichever comes first. With a deadline and no max_iters
+        # only the clock stops the search. self.num_iters tells how many ran,
+        # self.stop_reason why the search ended and self.iters_saved how many
+        # of max_iters were left.
+        if max_iters is None:
+            max_iters = self.get_budget() if deadline is None else math.inf
+        self.stop_reason = 'budget'
+
+        # A forced win needs no search
+        if self.threat_search and self.solve_root() is not None:
+            self.num_iters = 0
+            self.stop_reason = 'forced win'
+            self.iters_saved = max_iters if max_iters < math.inf else 0
+            return self.root_win, {self.root_win: 1.0}
+
         iters = 0
         action_win_rates = {} #store the table of actions and their ucb values
 
-        while(iters < BUDGET):
+        while(iters < max_iters):
+            # Nothing left to search once the root's outcome is known
+            if self.mcts_solver and self.root.proven is not None:
+                self.stop_reason = 'proven'
+                break
+
             #if ((iters + 1) % 100 == 0):
                 # NOTE: if your terminal driver doesn't support carriage returns you can use: 
-                # print("{}/{}".format(iters + 1, BUDGET))
-                #print("\riters/budget: {}/{}".format(iters + 1, BUDGET), end="")
+                # print("{}/{}".format(iters + 1, max_iters))
+                #print("\riters/budget: {}/{}".format(iters + 1, max_iters), end="")
 
             # TODO: select a node, rollout, and backpropagate
             s = self.select(self.root)
-            result = self.rollout(s)
-            self.backpropagate(s, result)
+            if self.mcts_solver and s.proven is not None:
+                result = self.proven_result(s)
+                self.backpropagate(s, result)
+                self.prove(s)
+            else:
+                result = self.rollout(s)
+                self.backpropagate(s, result)
+            if self.use_rave:
+                self.update_amaf(s, result)
+            self.release_heuristic(s)
+
+            # select and rollout pushed their moves on the simulator, take them
+            # back to return to the root state
+            self.simulator.rewind()
 
             iters += 1
+            if iters % DEADLINE_CHECK_INTERVAL == 0:
+                if deadline is not None and time.time() >= deadline:
+                    self.stop_reason = 'deadline'
+                    break
+                if self.early_stopping:
+                    reason = self.early_stop(max_iters - iters)
+                    if reason is not None:
+                        self.stop_reason = reason
+                        break
         #print()
+        self.num_iters = iters
+        self.iters_saved = max_iters - iters if max_iters < math.inf else 0
 
         # Note: Return the best action, and the table of actions and their win values 
         #   For that we simply need to use best_child and set c=0 as return values
@@ -296,17 +327,197 @@ class AI:
 
         return action, action_win_rates
 
+    def early_stop(self, iters_left):
+        # Why the search can stop with iters_left iterations to go, or None.
+        # Both tests need the child best_child(root, 0) picks, so the move
+        # returned is the one they settle. 'unreachable': it is also the most
+        # visited child and the runner-up would need a lopsided share of the
+        # visits left to get more visits, see EARLY_STOP_FRACTION.
+        # 'confident': its value is above every other one's with confidence
+        # intervals on the win rates apart. Untried actions could still beat
+        # them, so both need the root fully expanded (with progressive
+        # widening that takes many visits). RAVE values depend on AMAF
+        # statistics too, which neither test looks at, so there is no early
+        # stop with RAVE.
+        if self.use_rave or len(self.root.untried_actions) > 0 or len(self.root.children) < 2:
+            return None
+
+        best, best_action, values = self.best_child(self.root, 0)
+        if values[best_action] == math.inf:
+            return 'unreachable'
+        # Proven losses are never picked over anything else
+        others = [(values[action], child) for action, child in self.root.children
+                  if child is not best and values[action] != -math.inf]
+        if values[best_action] == -math.inf or any(child.num_visits == 0 for _, child in others):
+            return None
+        if len(others) == 0:
+            return 'unreachable'
+
+        visits_left = iters_left * self.playouts_per_rollout
+        runner_up = max(child.num_visits for _, child in others)
+        if best.num_visits - runner_up > EARLY_STOP_FRACTION * visits_left:
+            return 'unreachable'
+
+        if self.root.num_visits < EARLY_STOP_MIN_VISITS:
+            return None
+
+        def width(child):
+            return sqrt(log(2 / EARLY_STOP_DELTA) / (2 * child.num_visits))
+
+        lower = values[best_action] - width(best)
+        if all(lower > value + width(child) for value, child in others):
+            return 'confident'
+        return None
+
+    def ponder(self, stop):
+        # Keeps searching from the root until stop, a threading.Event, is set.
+        # Meant to run in a background thread during the opponent's turn,
+        # follow() then keeps the subtree of the move they play.
+        while not stop.is_set() and self.root.num_visits < PONDER_MAX_VISITS:
+            self.mcts_search(PONDER_ITERS)
+            if self.num_iters == 0:
+                # The root is solved, there is nothing left to search
+                break
+
+    def root_parallel_search(self, num_workers=NUM_WORKERS, worker_budget=None):
+        # Runs num_workers independent searches from the root, each in its own
+        # process with its own seed, and sums their root children's statistics
+        # before picking the best action like mcts_search does
+        if worker_budget is None:
+            worker_budget = self.get_budget()
+
+        # A forced win needs no search, like in mcts_search
+        if self.threat_search and self.solve_root() is not None:
+            return self.root_win, {self.root_win: 1.0}
+
+        seeds = [random.randrange(2 ** 32) for i in range(num_workers)]
+        jobs = [(type(self), self.simulator.state(), self.settings(), worker_budget, seed) for seed in seeds]
+        with multiprocessing.Pool(num_workers) as pool:
+            results = pool.starmap(search_worker, jobs)
+
+        # A worker's threat search can still find a win the one here ran out of time for
+        for num_visits, child_stats, root_win in results:
+            if root_win is not None:
+                return root_win, {root_win: 1.0}
+
+        self.restore_heuristic(self.root)
+        children = {action: child for action, child in self.root.children}
+        for num_visits, child_stats, root_win in results:
+            self.root.num_visits += num_visits
+
+            for action, num_wins, child_visits in child_stats:
+                if action not in children:
+                    self.simulator.push(*action)
+                    children[action] = self.make_child(self.root, action)
+                    self.simulator.pop()
+                    self.root.children.append((action, children[action]))
+                    self.root.untried_actions.remove(action)
+
+                children[action].num_wins += num_wins
+                children[action].num_visits += child_visits
+
+        _, action, action_win_rates = self.best_child(self.root, 0)
+
+        return action, action_win_rates
+
+    def leaf_parallel_search(self, num_workers=NUM_WORKERS, batch_size=LEAF_BATCH_SIZE,
+                             virtual_loss=VIRTUAL_LOSS, max_iters=None):
+        # Keeps the tree in this process but sends the rollouts to a pool of
+        # workers. Each step selects batch_size leaves, adding a virtual loss
+        # along each path so that the next selections spread out, and selects
+        # the next batch while the workers roll the previous one out
+        if virtual_loss < 1:
+            raise ValueError('virtual_loss must be at least 1, best_child needs visits on leaves still in flight')
+
+        if max_iters is None:
+            max_iters = self.get_budget()
+
+        # A forced win needs no search, like in mcts_search
+        if self.threat_search and self.solve_root() is not None:
+            return self.root_win, {self.root_win: 1.0}
+
+        def add_visits(node, visits):
+            while node is not None:
+                node.num_visits += visits
+                node = node.parent
+
+        def finish(leaves, results):
+            for path, result in zip(leaves, results.get()):
+                # Nodes shared by transpositions may have been reached through
+                # another parent since, point them back along this path
+                for i in range(1, len(path)):
+                    path[i].parent = path[i - 1]
+
+                leaf = path[-1]
+                add_visits(leaf, -virtual_loss)
+                self.backpropagate(leaf, result)
+                self.release_heuristic(leaf)
+
+        def root_proven():
+            return self.mcts_solver and self.root.proven is not None
+
+        iters = 0
+        in_flight = None
+        settings = self.settings()
+        with multiprocessing.Pool(num_workers) as pool:
+            while iters < max_iters and not root_proven():
+                leaves = []
+                jobs = []
+                while len(leaves) < batch_size and iters < max_iters and not root_proven():
+                    leaf = self.select(self.root)
+                    iters += 1
+
+                    if self.mcts_solver and leaf.proven is not None:
+                        # Its result is known, no rollout needed
+                        self.backpropagate(leaf, self.proven_result(leaf))
+                        self.prove(leaf)
+                        self.release_heuristic(leaf)
+                        self.simulator.rewind()
+                        continue
+
+                    add_visits(leaf, virtual_loss)
+
+                    path = []
+                    node = leaf
+                    while node is not None:
+                        path.append(node)
+                        node = node.parent
+                    leaves.append(path[::-1])
+
+                    # The jobs are sent after the rewind below, so copy the grid
+                    jobs.append((type(self), copy.deepcopy(self.simulator.state()), settings, random.randrange(2 ** 32)))
+                    self.simulator.rewind()
+
+                results = pool.starmap_async(rollout_worker, jobs)
+                if in_flight is not None:
+                    finish(*in_flight)
+                in_flight = (leaves, results)
+
+            if in_flight is not None:
+                finish(*in_flight)
+
+        _, action, action_win_rates = self.best_child(self.root, 0)
+
+        return action, action_win_rates
+
     def select(self, node):
 
         # TODO: select a child node
         # HINT: you can use 'is_terminal' field in the Node class to check if node is terminal node
         # NOTE: deterministic_test() requires using c=1 for best_child()
 
-        while not node.is_terminal:
-            if len(node.untried_actions) > 0:
+        while not node.is_terminal and (node.proven is None or not self.mcts_solver):
+            if len(node.untried_actions) > 0 and (not self.progressive_widening or self.can_widen(node)):
                 return self.expand(node)
             else:
-                node = self.best_child(node)[0]
+                child, action, _ = self.best_child(node)
+                self.simulator.push(*action)
+
+                # A node shared by transpositions backpropagates through the
+                # parent it was last reached from
+                child.parent = node
+                child.action = action
+                node = child
 
         return node
 
@@ -314,20 +525,147 @@ class AI:
 
         # TODO: add a new child node from an untried action and return this new node
 
-        # NOTE: passing the deterministic_test() requires popping an action like this
-        action = node.untried_actions.pop(0)
-
         # NOTE: Make sure to add the new node to node.children
         # NOTE: You may find the following methods useful:
         #   self.simulator.state()
         #   self.simulator.get_actions()
-        self.simulator.reset(*node.state)
-        self.simulator.place(*action)
+        # The simulator is already at node's state, select pushed the moves leading to it
+        self.restore_heuristic(node)
+
+        if len(node.children) == 0 and self.threat_search:
+            # Only the winning move is worth expanding when there is a forced win
+            win = self.forced_win(node, False, NODE_THREAT_NODES, NODE_THREAT_TIME)
+            if win is not None:
+                node.untried_actions = [win]
+                if self.mcts_solver:
+                    node.proven = node.player
+                    self.prove(node)
+
+        if self.progressive_widening:
+            if len(node.children) == 0:
+                self.rank_actions(node)
+            action = node.untried_actions.pop()
+        else:
+            # NOTE: passing the deterministic_test() requires popping an action like this
+            action = node.untried_actions.pop(0)
+
+        self.simulator.push(*action)
 
         # choose a child node to grow the search tree
-        child_node = Node(self.simulator.state(), self.simulator.get_actions(), node)
+        child_node = self.make_child(node, action)
         node.children.append((action, child_node))
 
+        if len(node.untried_actions) == 0:
+            self.release_heuristic(node)
+
+        return child_node
+
+    def forced_win(self, node, allow_threes, max_nodes, max_time):
+        # First move of a forced win for the player to move at node, which the
+        # simulator is at, or None if the threat search finds none in time
+        self.restore_heuristic(node)
+        sequence = ThreatSearch(self.simulator, node.heuristic, max_nodes, max_time).solve(allow_threes)
+        if sequence is None:
+            return None
+        return sequence[0]
+
+    def solve_root(self):
+        # VCT at the root, searched once for every new root
+        if self.solved_root is not self.root:
+            self.solved_root = self.root
+            self.root_win = self.forced_win(self.root, True, ROOT_THREAT_NODES, ROOT_THREAT_TIME)
+        return self.root_win
+
+    def proven_result(self, node):
+        # What a rollout from a proven node would always return
+        winner = node.proven
+        return {winner: self.playouts_per_rollout, other_color(winner): 0}
+
+    def prove(self, node):
+        # Passes node's proven outcome up the path it was reached by: a parent
+        # is won if one child wins for its player, and lost once every move
+        # has been expanded and each child wins for the other player.
+        # get_possible_actions prunes to the replies to a four and can drop
+        # the player's own gapped five, which only the threat search at
+        # expansion finds. Without it, "every move" may not be every move and
+        # only wins are proven.
+        while node.proven is not None and node.parent is not None and node.parent.proven is None:
+            parent = node.parent
+            if node.proven == parent.player:
+                parent.proven = parent.player
+            elif (self.threat_search and len(parent.untried_actions) == 0 and
+                  all(child.proven == node.proven for _, child in parent.children)):
+                parent.proven = node.proven
+            node = parent
+
+    def max_children(self, node):
+        # Number of children progressive widening allows at node's visits
+        return math.ceil(WIDENING_COEFFICIENT * max(node.num_visits, 1) ** WIDENING_EXPONENT)
+
+    def can_widen(self, node):
+        return len(node.children) < self.max_children(node)
+
+    def rank_actions(self, node):
+        # Sorts node's untried actions by the heuristic value of the move for
+        # the player to move, best last so that expand() pops it in O(1).
+        # Equally rated moves keep their get_actions() order.
+        values = {}
+        for action in node.untried_actions:
+            heuristic = Heuristic.create_from_heuristic(node.heuristic, self.simulator)
+            self.simulator.push(*action)
+            heuristic.place(*action)
+            values[action] = heuristic.get_value_for_player(node.player)
+            self.simulator.pop()
+
+        node.untried_actions.sort(key=lambda action: -values[action])
+        node.untried_actions.reverse()
+
+    def release_heuristic(self, node):
+        # Children only need the heuristic of their parent while it is being
+        # expanded, and best_child only their prior. Leaves drop theirs after
+        # their rollout and parents once fully expanded, so the tree doesn't
+        # keep one Heuristic per node.
+        if self.release_heuristics and node is not self.root:
+            node.heuristic = None
+
+    def restore_heuristic(self, node):
+        # Rebuilds a released heuristic, the simulator has to be at node's
+        # state. Usually the parent, still being expanded, has its heuristic,
+        # and node's is that one plus a move. Only a node without an
+        # ancestor that has one needs a full-board scan.
+        if node.heuristic is not None:
+            return
+
+        ancestor = node.parent
+        num_moves = 1
+        while ancestor is not None and ancestor.heuristic is None:
+            ancestor = ancestor.parent
+            num_moves += 1
+
+        if ancestor is None or num_moves > len(self.simulator.history):
+            node.heuristic = RootHeuristic(self.simulator)
+            return
+
+        # Replay the moves from ancestor to node, the way Node builds its heuristic
+        moves = [self.simulator.pop() for i in range(num_moves)]
+        heuristic = ancestor.heuristic
+        for action in reversed(moves):
+            self.simulator.push(*action)
+            heuristic = Heuristic.create_from_heuristic(heuristic, self.simulator)
+            heuristic.place(*action)
+        node.heuristic = heuristic
+
+    def make_child(self, node, action):
+        # The node reached by playing action from node, which the simulator
+        # already has on it. Move orders reaching the same position share the
+        # node found in the transposition table, with its statistics.
+        child_node = self.table.get(self.simulator.hash) if self.use_transpositions else None
+        if child_node is None:
+            child_node = Node(self.simulator, node, action)
+            self.table.put(self.simulator.hash, child_node)
+        else:
+            child_node.parent = node
+            child_node.action = action
         return child_node
 
     def best_child(self, node, c=1):
@@ -348,12 +686,22 @@ class AI:
             Q_c = child.num_wins
             N_c = child.num_visits
 
-            node_quality = Q_c / N_c + child.heuristic.get_value_for_player(node.state[0]) / (10 * (N_c + 1))
-            ucb = node_quality + c * sqrt( (2 * log(N_n)) / N_c )
+            if child.proven is not None and self.mcts_solver:
+                # Proven wins are always picked, proven losses only if nothing else is left
+                ucb = math.inf if child.proven == node.player else -math.inf
+            else:
+                win_rate = Q_c / N_c
+                if self.use_rave and action in node.amaf:
+                    amaf_wins, amaf_visits = node.amaf[action]
+                    beta = sqrt(RAVE_EQUIVALENCE / (3 * N_c + RAVE_EQUIVALENCE))
+                    win_rate = (1 - beta) * win_rate + beta * amaf_wins / amaf_visits
+
+                node_quality = win_rate + child.prior / (10 * (N_c + 1))
+                ucb = node_quality + c * sqrt( (2 * log(N_n)) / N_c )
 
             action_ucb_table[action] = ucb
 
-            if ucb > best_ucb:
+            if ucb > best_ucb or best_child_node is None:
                 best_child_node = child
                 best_action = action
                 best_ucb = ucb
@@ -361,20 +709,45 @@ class AI:
         return best_child_node, best_action, action_ucb_table
 
     def backpropagate(self, node, result):
+        # result holds the reward of each color, summed over the
+        # playouts_per_rollout playouts it stands for. Rewards can be
+        # fractions, like the win probabilities of truncated rollouts.
 
         def delta(s):
-            return result[s.state[0]]
+            return result[s.player]
 
         while node is not None:
             # TODO: backpropagate the information about winner
             # IMPORTANT: each node should store the number of wins for the player of its **parent** node
-            node.num_visits += 1
+            node.num_visits += self.playouts_per_rollout
 
             if node.parent is not None:
                 node.num_wins += delta(node.parent)
 
             node = node.parent
 
+    def update_amaf(self, node, result):
+        # All moves as first: every node on the path to node counts the moves
+        # its player made after it, in the tree or in the rollout, as if it
+        # had played them first. The simulator's history still holds every
+        # move of the simulation from the root, move i leaves depth i + 1.
+        moves = [(r, c, player) for r, c, player, *_ in self.simulator.history]
+        depth = 0
+        path = node
+        while path.parent is not None:
+            depth += 1
+            path = path.parent
+
+        while node is not None:
+            for r, c, player in moves[depth:]:
+                if player == node.player:
+                    stats = node.amaf.setdefault((r, c), [0, 0])
+                    stats[0] += result[player]
+                    stats[1] += self.playouts_per_rollout
+
+            node = node.parent
+            depth -= 1
+
     def rollout(self, node):
 
         # TODO: rollout (called DefaultPolicy in the slides)
@@ -386,13 +759,17 @@ class AI:
         #   self.simulator.place(r, c)
         # NOTE: deterministic_test() requires that you select a random move using self.simulator.rand_move()
 
-        self.simulator.reset(*node.state)
-
+        # The simulator is already at node's state, mcts_search rewinds it afterwards
 
         # TODO: Use heuristics for a 1-level min-max tree + forced attacks / defenses
+        depth = 0
         while not self.simulator.game_over:
+            if self.rollout_depth is not None and depth >= self.rollout_depth:
+                return self.heuristic_reward(self.position_score())
+
             action = self.simulator.rand_move()
-            self.simulator.place(*action)
+            self.simulator.push(*action)
+            depth += 1
 
         # Determine reward indicator from result of rollout
         reward = {}
@@ -403,3 +780,22 @@ class AI:
             reward[BLACK] = 0
             reward[WHITE] = 1
         return reward
+
+    def position_score(self):
+        # Heuristic score of each color at the simulator's state. The rollout
+        # only needs the score, numpy_eval computes it without building lines.
+        if evaluate is not None:
+            return evaluate(self.simulator.grid, self.simulator.player)
+        return Heuristic(self.simulator).score
+
+    def heuristic_reward(self, score):
+        # Reward of a rollout cut short: each color's win probability from the
+        # heuristic value of the position, through a logistic. tanh is the
+        # same curve and doesn't overflow on the values of fours and fives.
+        value = score[BLACK] - score[WHITE]
+        black_win = 0.5 * (1 + math.tanh(value / (2 * ROLLOUT_EVAL_SCALE)))
+
+        reward = {}
+        reward[BLACK] = black_win
+        reward[WHITE] = 1 - black_win
+        return reward
@@ -0,0 +1,225 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+import numpy as np
+from game import Game, WHITE, BLACK, GRID_COUNT
+from heuristic import Heuristic
+import ai
+from numpy_eval import CELL_BLACK, CELL_WHITE, COLOR_TO_CELL
+
+# Nodes ArrayTree makes room for up front, it doubles when it runs out
+INITIAL_CAPACITY = 4096
+
+NO_NODE = -1
+
+class ArrayTree:
+    """Search tree stored as one preallocated NumPy array per field.
+
+    Nodes are indexes into the arrays. The first expansion of a node reserves
+    a contiguous block with one slot per move it could expand, and children
+    fill the block in expansion order, so the children of node are
+    first_child[node] to first_child[node] + num_children[node] and a UCB
+    over all of them is one slice of each array.
+    """
+
+    FIELDS = {
+        'visits': np.int64,
+        'wins': np.float64, # wins for the player of the parent, like Node.num_wins
+        'prior': np.float64, # heuristic value of the node for the player of its parent
+        'parent': np.int32,
+        'first_child': np.int32,
+        'num_children': np.int32,
+        'action': np.int16, # r * GRID_COUNT + c of the move leading to the node
+        'player': np.int8, # CELL_BLACK or CELL_WHITE, the player to move
+        'terminal': np.bool_,
+    }
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def capacity(self):
+        return len(self.visits)
+
+    def reserve(self, count):
+        # Index of count new consecutive nodes, with no parent and no children yet
+        while self.size + count > self.capacity():
+            for name in self.FIELDS:
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+        start = self.size
+        self.size += count
+        self.parent[start:self.size] = NO_NODE
+        self.first_child[start:self.size] = NO_NODE
+        return start
+
+    def children(self, node):
+        first = self.first_child[node]
+        if first == NO_NODE:
+            return range(0)
+        return range(first, first + self.num_children[node])
+
+    def arrays(self):
+        return {name: getattr(self, name)[:self.size] for name in self.FIELDS}
+
+    def save(self, file):
+        np.savez(file, **self.arrays())
+
+    @staticmethod
+    def load(file):
+        data = np.load(file)
+        tree = ArrayTree(max(1, len(data['visits'])))
+        tree.size = len(data['visits'])
+        for name in ArrayTree.FIELDS:
+            getattr(tree, name)[:tree.size] = data[name]
+        return tree
+
+def encode_action(action):
+    return action[0] * GRID_COUNT + action[1]
+
+def decode_action(code):
+    return divmod(int(code), GRID_COUNT)
+
+class ArrayAI(ai.AI):
+    # ai.AI with the tree in an ArrayTree: the same search and UCB, but nodes
+    # are indexes and best_child is vectorized over the children's slice.
+    # Heuristics and untried actions, still needed to expand a node, are
+    # kept in lists by node index. Only mcts_search is supported, without
+    # transpositions, the threat search, proven values, early stopping or RAVE.
+    threat_search = False
+    mcts_solver = False
+
+    def __init__(self, state):
+        self.simulator = Game()
+        self.simulator.reset(*state) #using * to unpack the state tuple
+
+        self.tree = ArrayTree()
+        self.heuristics = []
+        self.untried_actions = []
+        self.root = self.tree.reserve(1)
+        self.init_node(self.root, ai.RootHeuristic(self.simulator))
+
+    def init_node(self, node, heuristic):
+        # Fills in node for the position the simulator is at
+        tree = self.tree
+        tree.player[node] = COLOR_TO_CELL[self.simulator.player]
+        tree.terminal[node] = self.simulator.game_over
+
+        while len(self.heuristics) < tree.size:
+            self.heuristics.append(None)
+            self.untried_actions.append(None)
+        self.heuristics[node] = heuristic
+        self.untried_actions[node] = heuristic.get_possible_actions(list(self.simulator.get_actions()))
+
+    def select(self, node):
+        tree = self.tree
+        while not tree.terminal[node]:
+            if len(self.untried_actions[node]) > 0:
+                return self.expand(node)
+            else:
+                node = self.ucb_child(node)
+                self.simulator.push(*decode_action(tree.action[node]))
+
+        return node
+
+    def expand(self, node):
+        tree = self.tree
+        untried_actions = self.untried_actions[node]
+
+        if tree.first_child[node] == NO_NODE:
+            # Room for every move node can expand, untried_actions only shrinks
+            tree.first_child[node] = tree.reserve(len(untried_actions))
+
+        # NOTE: passing the deterministic_test() requires popping an action like this
+        action = untried_actions.pop(0)
+
+        child = tree.first_child[node] + tree.num_children[node]
+        tree.num_children[node] += 1
+        tree.parent[child] = node
+        tree.action[child] = encode_action(action)
+
+        # A released heuristic is rebuilt while the simulator is at node's state
+        self.restore_heuristic(node)
+        self.simulator.push(*action)
+
+        heuristic = Heuristic.create_from_heuristic(self.heuristics[node], self.simulator)
+        heuristic.place(*action)
+        parent_color = BLACK if tree.player[node] == CELL_BLACK else WHITE
+        tree.prior[child] = heuristic.get_value_for_player(parent_color)
+        self.init_node(child, heuristic)
+
+        if len(untried_actions) == 0:
+            self.release_heuristic(node)
+
+        return child
+
+    def release_heuristic(self, node):
+        if self.release_heuristics and node != self.root:
+            self.heuristics[node] = None
+
+    def restore_heuristic(self, node):
+        # Same as ai.AI.restore_heuristic, from the nearest ancestor that still
+        # has its heuristic
+        if self.heuristics[node] is not None:
+            return
+
+        tree = self.tree
+        ancestor = tree.parent[node]
+        num_moves = 1
+        while ancestor != NO_NODE and self.heuristics[ancestor] is None:
+            ancestor = tree.parent[ancestor]
+            num_moves += 1
+
+        if ancestor == NO_NODE or num_moves > len(self.simulator.history):
+            self.heuristics[node] = ai.RootHeuristic(self.simulator)
+            return
+
+        moves = [self.simulator.pop() for i in range(num_moves)]
+        heuristic = self.heuristics[ancestor]
+        for action in reversed(moves):
+            self.simulator.push(*action)
+            heuristic = Heuristic.create_from_heuristic(heuristic, self.simulator)
+            heuristic.place(*action)
+        self.heuristics[node] = heuristic
+
+    def ucb_values(self, node, c):
+        # Same formula and operation order as ai.AI.best_child, so the values
+        # are bit for bit the same
+        tree = self.tree
+        first = tree.first_child[node]
+        children = slice(first, first + tree.num_children[node])
+        N_c = tree.visits[children]
+
+        node_quality = tree.wins[children] / N_c + tree.prior[children] / (10 * (N_c + 1))
+        return node_quality + c * np.sqrt((2 * math.log(tree.visits[node])) / N_c)
+
+    def ucb_child(self, node, c=1):
+        # argmax returns the first maximum, the same tie-break as best_child
+        return self.tree.first_child[node] + int(np.argmax(self.ucb_values(node, c)))
+
+    def best_child(self, node, c=1):
+        ucb = self.ucb_values(node, c)
+        best = int(np.argmax(ucb))
+        children = self.tree.children(node)
+
+        action_ucb_table = {}
+        for i, child in enumerate(children):
+            action_ucb_table[decode_action(self.tree.action[child])] = ucb[i].item()
+
+        best_child_node = children[best]
+        return best_child_node, decode_action(self.tree.action[best_child_node]), action_ucb_table
+
+    def backpropagate(self, node, result):
+        tree = self.tree
+        reward = {CELL_BLACK: result[BLACK], CELL_WHITE: result[WHITE]}
+
+        while node != NO_NODE:
+            tree.visits[node] += self.playouts_per_rollout
+
+            parent = tree.parent[node]
+            if parent != NO_NODE:
+                tree.wins[node] += reward[tree.player[parent]]
+
+            node = parent
@@ -0,0 +1,118 @@
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from game import WHITE, BLACK, GRID_COUNT
+import ai
+from numpy_eval import CELL_EMPTY, CELL_BLACK, CELL_WHITE, encode_board
+
+# Number of random playouts BatchAI runs from every leaf
+PLAYOUTS_PER_LEAF = 64
+
+# BatchAI runs PLAYOUTS_PER_LEAF playouts per iteration, so it needs fewer of them
+BUDGET = 250
+
+CELL_TO_COLOR = {CELL_BLACK: BLACK, CELL_WHITE: WHITE}
+
+# OFFSETS[dir, side, step] is the (dr, dc) of the step-th neighbour of a cell
+# on one side of it in each of the four line directions
+DIR_DELTAS = np.array([(1, 0), (0, 1), (1, 1), (1, -1)])
+OFFSETS = (DIR_DELTAS[:, None, None, :] * np.array([1, -1])[None, :, None, None] *
+           np.arange(1, 5)[None, None, :, None])
+
+ROWS = np.arange(GRID_COUNT)[None, :, None]
+COLUMNS = np.arange(GRID_COUNT)[None, None, :]
+
+def active_area(boxes):
+    # (K, GRID_COUNT, GRID_COUNT) mask of the cells inside each board's box
+    min_r, max_r, min_c, max_c = [boxes[:, i, None, None] for i in range(4)]
+    return (ROWS >= min_r) & (ROWS <= max_r) & (COLUMNS >= min_c) & (COLUMNS <= max_c)
+
+def makes_five(boards, r, c, colors):
+    # Whether the stone just placed at (r[i], c[i]) on boards[i] completes five in a row
+    cells = np.stack([r, c], axis=1)[:, None, None, None, :] + OFFSETS[None]
+    inside = ((cells >= 0) & (cells < GRID_COUNT)).all(axis=-1)
+    cells = np.clip(cells, 0, GRID_COUNT - 1)
+
+    board_index = np.arange(len(boards))[:, None, None, None]
+    same = inside & (boards[board_index, cells[..., 0], cells[..., 1]] == colors[:, None, None, None])
+
+    # Stones of the same color right next to the new one, on each side
+    run = np.cumprod(same, axis=3).sum(axis=3)
+    return (1 + run.sum(axis=2) >= 5).any(axis=1)
+
+def play_out_batch(boards, players, boxes, rng):
+    """Plays K random games to the end, one ply of every game per step.
+
+    boards is a (K, GRID_COUNT, GRID_COUNT) int8 array in the numpy_eval
+    encoding, players the cell value of the color to move on each board and
+    boxes a (K, 4) array of each game's (min_r, max_r, min_c, max_c) active
+    area. Moves are drawn uniformly from the empty cells of the active area
+    and the rules match Game.place: five in a row wins, and filling the
+    active area ends the game with a WHITE win. boards, players and boxes
+    are modified in place.
+
+    Returns the cell value of each game's winner.
+    """
+    num_boards = len(boards)
+    winners = np.zeros(num_boards, dtype=np.int8)
+    active = np.arange(num_boards)
+
+    while len(active) > 0:
+        active_boards = boards[active]
+        box = boxes[active]
+        legal = (active_boards == CELL_EMPTY) & active_area(box)
+
+        # The legal cell with the highest random key is a uniform pick
+        keys = rng.random(legal.shape, dtype=np.float32) * legal
+        r, c = np.divmod(keys.reshape(len(active), -1).argmax(axis=1), GRID_COUNT)
+
+        colors = players[active]
+        active_boards[np.arange(len(active)), r, c] = colors
+        won = makes_five(active_boards, r, c, colors)
+
+        box[:, 0] = np.maximum(0, np.minimum(box[:, 0], r - 1))
+        box[:, 1] = np.minimum(GRID_COUNT - 1, np.maximum(box[:, 1], r + 1))
+        box[:, 2] = np.maximum(0, np.minimum(box[:, 2], c - 1))
+        box[:, 3] = np.minimum(GRID_COUNT - 1, np.maximum(box[:, 3], c + 1))
+        full = ~((active_boards == CELL_EMPTY) & active_area(box)).any(axis=(1, 2))
+
+        boards[active] = active_boards
+        boxes[active] = box
+        winners[active[won]] = colors[won]
+        winners[active[full]] = CELL_WHITE
+        players[active] = -colors
+        active = active[~(won | full)]
+
+    return winners
+
+def play_out(game, num_playouts, rng):
+    # Runs num_playouts random games from the state of game, leaving game untouched
+    if game.game_over:
+        winner = CELL_BLACK if game.winner == BLACK else CELL_WHITE
+        return np.full(num_playouts, winner, dtype=np.int8)
+
+    boards = np.repeat(encode_board(game.grid)[np.newaxis], num_playouts, axis=0)
+    player = CELL_BLACK if game.player == BLACK else CELL_WHITE
+    players = np.full(num_playouts, player, dtype=np.int8)
+    boxes = np.repeat(np.array([[game.min_r, game.max_r, game.min_c, game.max_c]]), num_playouts, axis=0)
+    return play_out_batch(boards, players, boxes, rng)
+
+class BatchAI(ai.AI):
+    # ai.AI with every rollout replaced by PLAYOUTS_PER_LEAF NumPy playouts
+    playouts_per_rollout = PLAYOUTS_PER_LEAF
+
+    def __init__(self, state, seed=None):
+        ai.AI.__init__(self, state)
+        self.rng = np.random.default_rng(seed)
+
+    def get_budget(self):
+        return BUDGET
+
+    def rollout(self, node):
+        winners = play_out(self.simulator, self.playouts_per_rollout, self.rng)
+
+        # Number of wins of each color, backpropagated as that many playouts
+        reward = {}
+        reward[BLACK] = int(np.count_nonzero(winners == CELL_BLACK))
+        reward[WHITE] = int(np.count_nonzero(winners == CELL_WHITE))
+        return reward
@@ -0,0 +1,171 @@
+import time
+import tracemalloc
+from game import Game
+from heuristic import Heuristic
+import ai
+
+NUM_STATES = 3
+MEMORY_BUDGET = 1000
+NUM_EVALUATIONS = 300
+NUM_PLAYOUTS = 2000
+SPEED_BUDGET = 1000
+ROLLOUT_DEPTHS = [None, 20, 10, 5]
+STRENGTH_PLAYS = 10
+EARLY_STOP_BUDGET = 2500
+
+def load_states(num_states=NUM_STATES):
+    with open("test_states") as file:
+        return [state[:-1] for state in file.readlines()][:num_states]
+
+def count_nodes(node, seen=None):
+    # Nodes shared by transpositions are counted once
+    if seen is None:
+        seen = set()
+    if id(node) in seen:
+        return 0
+    seen.add(id(node))
+    return 1 + sum(count_nodes(child, seen) for _, child in node.children)
+
+def node_memory_benchmark():
+    print('Memory per node:')
+    budget = ai.BUDGET
+    ai.BUDGET = MEMORY_BUDGET
+
+    for state in load_states():
+        game = Game()
+        game.load_state_text(state)
+
+        for release_heuristics in [False, True]:
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            ai_player = ai.AI(game.state())
+            ai_player.release_heuristics = release_heuristics
+            ai_player.mcts_search()
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+            num_nodes = count_nodes(ai_player.root)
+            kept = 'released' if release_heuristics else 'kept'
+            print(f'{num_nodes} nodes, {used / num_nodes:.0f} bytes per node with heuristics {kept}')
+        print(f'Transposition table: {ai_player.table}')
+
+    ai.BUDGET = budget
+
+def evaluator_benchmark():
+    import numpy as np
+    import numpy_eval
+
+    print('Full-board evaluation:')
+    games = []
+    for state in load_states():
+        game = Game()
+        game.load_state_text(state)
+        games.append(game)
+
+    def time_per_position(evaluate):
+        start_time = time.time()
+        for i in range(NUM_EVALUATIONS):
+            for game in games:
+                evaluate(game)
+        return (time.time() - start_time) / (NUM_EVALUATIONS * len(games))
+
+    print(f'Heuristic: {1e6 * time_per_position(Heuristic):.0f} us per position')
+    print(f'NumpyHeuristic: {1e6 * time_per_position(numpy_eval.NumpyHeuristic):.0f} us per position')
+    print(f'numpy_eval.evaluate: {1e6 * time_per_position(lambda game: numpy_eval.evaluate(game.grid, game.player)):.0f} us per position')
+
+    boards = np.array([numpy_eval.encode_board(game.grid) for game in games] * NUM_EVALUATIONS)
+    players = [game.player for game in games] * NUM_EVALUATIONS
+    start_time = time.time()
+    numpy_eval.evaluate_batch(boards, players)
+    print(f'numpy_eval.evaluate_batch: {1e6 * (time.time() - start_time) / len(boards):.0f} us per position')
+
+def rollout_benchmark():
+    import numpy as np
+    import batch_rollout
+
+    print('Random playouts per second:')
+    rng = np.random.default_rng()
+
+    for state in load_states():
+        game = Game()
+        game.load_state_text(state)
+
+        start_time = time.time()
+        for i in range(NUM_PLAYOUTS):
+            while not game.game_over:
+                game.push(*game.rand_move())
+            game.rewind()
+        scalar_rate = NUM_PLAYOUTS / (time.time() - start_time)
+
+        start_time = time.time()
+        batch_rollout.play_out(game, NUM_PLAYOUTS, rng)
+        batch_rate = NUM_PLAYOUTS / (time.time() - start_time)
+
+        print(f'scalar: {scalar_rate:.0f}, batch of {NUM_PLAYOUTS}: {batch_rate:.0f}')
+
+def truncated_rollout_benchmark(strength=False):
+    # Iterations per second for each rollout depth, None plays to the end.
+    # With strength, also plays win_test against stock_ai at each depth.
+    import test
+
+    print('Iterations per second by rollout depth:')
+    rollout_depth = ai.AI.rollout_depth
+
+    for depth in ROLLOUT_DEPTHS:
+        ai.AI.rollout_depth = depth
+        rates = []
+        for state in load_states():
+            game = Game()
+            game.load_state_text(state)
+            ai_player = ai.AI(game.state())
+            ai_player.threat_search = False # some states are forced wins that need no search
+
+            start_time = time.time()
+            ai_player.mcts_search(SPEED_BUDGET)
+            rates.append(ai_player.num_iters / (time.time() - start_time))
+        print(f'depth {depth}: ' + ', '.join(f'{rate:.0f}' for rate in rates))
+
+    if strength:
+        num_plays = test.NUM_PLAYS
+        test.NUM_PLAYS = STRENGTH_PLAYS
+        for depth in ROLLOUT_DEPTHS:
+            print(f'win_test with rollout depth {depth}:')
+            ai.AI.rollout_depth = depth
+            test.win_test()
+        test.NUM_PLAYS = num_plays
+
+    ai.AI.rollout_depth = rollout_depth
+
+def early_stopping_benchmark():
+    # Iterations an early stopping search runs on every test state, and
+    # whether it picks the move the search with the whole budget picks
+    print(f'Early stopping with a budget of {EARLY_STOP_BUDGET}:')
+    total_saved = 0
+    changed = 0
+    for state in load_states(None):
+        game = Game()
+        game.load_state_text(state)
+
+        moves = []
+        iters = []
+        for early_stopping in [True, False]:
+            ai_player = ai.AI(game.state())
+            ai_player.threat_search = False # some states are forced wins that need no search
+            ai_player.early_stopping = early_stopping
+            moves.append(ai_player.mcts_search(EARLY_STOP_BUDGET)[0])
+            iters.append(ai_player.num_iters)
+            if early_stopping:
+                stop_reason = ai_player.stop_reason
+
+        # Proven roots stop without early stopping too
+        total_saved += iters[1] - iters[0]
+        changed += moves[0] != moves[1]
+        print(f'{iters[0]} of {iters[1]} iterations ({stop_reason}), move {moves[0]}, same move: {moves[0] == moves[1]}')
+    print(f'{total_saved} iterations saved, {changed} moves changed')
+
+if __name__ == '__main__':
+    node_memory_benchmark()
+    evaluator_benchmark()
+    rollout_benchmark()
+    truncated_rollout_benchmark()
+    early_stopping_benchmark()
@@ -1,6 +1,7 @@
 # NOTE: do not modify this file
 from __future__ import print_function
 import copy
+import random
 
 GRID_COUNT = 11
 
@@ -10,6 +11,171 @@ EMPTY = '.'
 
 ROLLOUT_RNG_MAX = 1000;
 
+# Bitboard layout: cell (r, c) is bit r * BIT_STRIDE + c. Every row is padded
+# with an always-empty guard column so that shifting never wraps a line of
+# stones into the next row.
+BIT_STRIDE = GRID_COUNT + 1
+
+# Shift between neighbouring cells for each direction checked by check_win,
+# in the same order as the original continuous_count_both walks
+WIN_SHIFTS = [BIT_STRIDE, 1, BIT_STRIDE + 1, BIT_STRIDE - 1]
+
+def cell_bit(r, c):
+    return 1 << (r * BIT_STRIDE + c)
+
+def five_window(r, c, shift):
+    # Bits of every cell that can start a five-in-a-row through (r, c)
+    bit = cell_bit(r, c)
+    return bit | (bit >> shift) | (bit >> 2 * shift) | (bit >> 3 * shift) | (bit >> 4 * shift)
+
+# WIN_WINDOWS[r][c] holds five_window(r, c, shift) for each of the WIN_SHIFTS
+WIN_WINDOWS = [[[five_window(r, c, shift) for shift in WIN_SHIFTS] for c in range(GRID_COUNT)]
+               for r in range(GRID_COUNT)]
+
+# Zobrist keys: the hash of a position is the XOR of the key of every stone,
+# plus ZOBRIST_TURN when WHITE is to move. A private generator keeps the
+# global random sequence untouched.
+_zobrist_rng = random.Random(0)
+ZOBRIST = {color: [[_zobrist_rng.getrandbits(64) for c in range(GRID_COUNT)] for r in range(GRID_COUNT)]
+           for color in [BLACK, WHITE]}
+ZOBRIST_TURN = _zobrist_rng.getrandbits(64)
+
+class ActionList:
+    """Legal moves in the order they were added, with O(1) membership and
+    O(log n) removal and indexing.
+
+    rand_move picks actions by index, so removing one must shift the later
+    actions down exactly like list.remove does (a swap-remove would change
+    which move every rollout_rng value selects). Actions are therefore never
+    moved: removing one only clears its slot, and a Fenwick tree counting
+    the occupied slots finds the i-th remaining action.
+    """
+
+    def __init__(self, capacity, actions=()):
+        self.slots = [] # every action ever added, by slot
+        self.index = {} # action -> slot, for the actions still in the list
+        self.size = capacity
+        self.tree = [0] * (capacity + 1) # Fenwick tree of occupied slots
+        self.top = 1 # highest power of two <= capacity
+        while self.top * 2 <= capacity:
+            self.top *= 2
+        self.extend(actions)
+
+    def _update(self, slot, delta):
+        i = slot + 1
+        tree = self.tree
+        size = self.size
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def _find_slot(self, i):
+        # Binary lifting over the Fenwick tree: the slot of the i-th action
+        tree = self.tree
+        pos = 0
+        remaining = i + 1
+        step = self.top
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] < remaining:
+                pos = nxt
+                remaining -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def append(self, action):
+        slot = len(self.slots)
+        self.slots.append(action)
+        self.index[action] = slot
+        self._update(slot, 1)
+
+    def extend(self, actions):
+        if len(self.slots) > 0:
+            for action in actions:
+                self.append(action)
+            return
+
+        # Filling an empty list: build the Fenwick tree in linear time by
+        # pushing each node's count into its parent once it is complete
+        tree = self.tree
+        size = self.size
+        i = 0
+        for action in actions:
+            self.slots.append(action)
+            self.index[action] = i
+            i += 1
+            tree[i] += 1
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+
+        # The nodes past the last slot that cover it still have to pass their
+        # counts up the tree
+        if i > 0:
+            i += i & -i
+            while i <= size:
+                parent = i + (i & -i)
+                if parent <= size:
+                    tree[parent] += tree[i]
+                i = parent
+
+    def remove(self, action):
+        self._update(self.index.pop(action), -1)
+
+    # drops every action appended after the list had num_slots slots
+    def truncate(self, num_slots):
+        while len(self.slots) > num_slots:
+            action = self.slots.pop()
+            if self.index.get(action) == len(self.slots):
+                del self.index[action]
+                self._update(len(self.slots), -1)
+
+    # puts a removed action back in the slot it was removed from
+    def restore(self, action, slot):
+        self.index[action] = slot
+        self._update(slot, 1)
+
+    def pop(self, i=-1):
+        action = self[i]
+        self.remove(action)
+        return action
+
+    def copy(self):
+        new_list = ActionList(0)
+        new_list.slots = list(self.slots)
+        new_list.index = dict(self.index)
+        new_list.size = self.size
+        new_list.tree = list(self.tree)
+        new_list.top = self.top
+        return new_list
+
+    # actions are immutable tuples, so a shallow copy is already a deep one
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __contains__(self, action):
+        return action in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.index)
+        if not 0 <= i < len(self.index):
+            raise IndexError('action index out of range')
+        return self.slots[self._find_slot(i)]
+
+    def __iter__(self):
+        index = self.index
+        return (action for slot, action in enumerate(self.slots) if index.get(action) == slot)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
 class Game:
     def __init__(self, player=BLACK, grid=None):
         self.rollout_rng = 0
@@ -18,19 +184,24 @@ class Game:
     # resets the board to the specified state;
     # randomly initalizes if no state provided
     def reset(self, player=BLACK, init_grid=None):
+        self.history = []
         self.winning_pos = None
         self.winner = None
         self.game_over = False
         self.player = player
-        self.actions = []
         self.maxrc = (len(init_grid) - 1) if init_grid is not None else (GRID_COUNT - 1)
+        self.actions = ActionList((self.maxrc + 1) ** 2)
         self.max_r = self.max_c = self.min_r = self.min_c = (self.maxrc)//2
 
         if init_grid is not None:
             self.grid = copy.deepcopy(init_grid)
+            self.bitboards = self.grid_to_bitboards(self.grid)
+            self.hash = self.grid_to_hash(self.grid, player)
             self.populate(False)
         else:
             self.grid = self.new_grid(GRID_COUNT)
+            self.bitboards = {BLACK: 0, WHITE: 0}
+            self.hash = self.grid_to_hash(self.grid, player)
             self.populate()
             self.place(*(self.get_actions()[0]))
             self.place(*self.rand_move())
@@ -73,16 +244,36 @@ class Game:
                     self.reset_maxes(r, c, in_reset)
                     self.check_win(r, c)
 
+        new_actions = []
         for i in range(self.min_r, self.max_r+1):
             for j in range(self.min_c, self.max_c+1):
                 if self.grid[i][j] == EMPTY:
                     if (i, j) not in self.actions:
-                        self.actions.append((i,j))
+                        new_actions.append((i,j))
+        self.actions.extend(new_actions)
 
     # returns the current game state
     def state(self):
         return (self.player, self.grid)
 
+    # returns one integer mask per color with a bit set for each stone
+    def grid_to_bitboards(self, grid):
+        bitboards = {BLACK: 0, WHITE: 0}
+        for r in range(len(grid)):
+            for c in range(len(grid[r])):
+                if grid[r][c] != EMPTY:
+                    bitboards[grid[r][c]] |= cell_bit(r, c)
+        return bitboards
+
+    # Zobrist hash of a position, place() and pop() keep self.hash up to date
+    def grid_to_hash(self, grid, player):
+        key = ZOBRIST_TURN if player == WHITE else 0
+        for r in range(len(grid)):
+            for c in range(len(grid[r])):
+                if grid[r][c] != EMPTY:
+                    key ^= ZOBRIST[grid[r][c]][r][c]
+        return key
+
     def new_grid(self, grid_length):
         new_grid = []
         for i in range(grid_length):
@@ -92,13 +283,15 @@ class Game:
     # places the current player's piece in the specified location
     # and swaps players
     def place(self, r, c):
-        if (r, c) in self.get_actions():
+        if (r, c) in self.actions:
             self.actions.remove((r, c))
             self.grid[r][c] = self.player
+            self.bitboards[self.player] |= cell_bit(r, c)
+            self.hash ^= ZOBRIST[self.player][r][c] ^ ZOBRIST_TURN
             self.reset_maxes(r, c, True)
 
             self.check_win(r, c)
-            if len(self.get_actions()) == 0:
+            if len(self.actions) == 0:
                 self.game_over = True
                 self.winner = WHITE
 
@@ -106,18 +299,60 @@ class Game:
             return True
         return False
 
+    # same as place, but remembers everything the move changes so that
+    # pop() can take it back without copying or rescanning the grid
+    def push(self, r, c):
+        if (r, c) not in self.actions:
+            return False
+        self.history.append((r, c, self.player, self.actions.index[(r, c)], len(self.actions.slots),
+                             self.min_r, self.max_r, self.min_c, self.max_c,
+                             self.winner, self.game_over, self.winning_pos))
+        return self.place(r, c)
+
+    # undoes the last push and returns its location
+    def pop(self):
+        (r, c, self.player, slot, num_slots,
+         self.min_r, self.max_r, self.min_c, self.max_c,
+         self.winner, self.game_over, self.winning_pos) = self.history.pop()
+
+        self.grid[r][c] = EMPTY
+        self.bitboards[self.player] &= ~cell_bit(r, c)
+        self.hash ^= ZOBRIST[self.player][r][c] ^ ZOBRIST_TURN
+        self.actions.truncate(num_slots)
+        self.actions.restore((r, c), slot)
+        return r, c
+
+    # undoes every push since the last reset
+    def rewind(self):
+        while len(self.history) > 0:
+            self.pop()
+
     def check_win(self, r, c):
+        player = self.grid[r][c]
+        board = self.bitboards[player]
+        windows = WIN_WINDOWS[r][c]
+
+        for i in range(len(WIN_SHIFTS)):
+            shift = WIN_SHIFTS[i]
+            # Each bit left in fives marks the first stone of five in a row
+            fives = board & (board >> shift)
+            fives &= fives >> (2 * shift)
+            fives &= board >> (4 * shift)
+            if fives & windows[i]:
+                self.winner = player
+                self.game_over = True
+                self.winning_pos = self.winning_run(r, c)
+                return
+
+    # returns the (start, end) cells of the longest run through (r, c);
+    # only needed once a win has been found, so walking the grid is fine
+    def winning_run(self, r, c):
         runs = [ self.continuous_count_both(r, c, -1, 0),
                  self.continuous_count_both(r, c, 0, 1),
                  self.continuous_count_both(r, c, 1, 1),
                  self.continuous_count_both(r, c, -1, 1) ]
         
-        max_run = max(runs, key=lambda x: x[1])
-
-        if max_run[1] >= 5:
-            self.winner = self.grid[r][c]
-            self.game_over = True
-            self.winning_pos = max_run[0]
+        return max(runs, key=lambda x: x[1])[0]
 
     def continuous_count_both(self, r, c, dr, dc):
         start, start_count = self.continuous_count(r, c, dr, dc)
@@ -0,0 +1,648 @@
+from __future__ import absolute_import, division, print_function
+
+from game import WHITE, BLACK, GRID_COUNT, EMPTY
+
+#[(0, 0), (0, 1), ..., (0, GRID_COUNT-1)]
+STARTING_HOR = set(((0, i) for i in range(GRID_COUNT)))
+
+#[(0, 0), (1, 0), ..., (GRID_COUNT-1, 0)]
+STARTING_VER = set((i, 0) for i in range(GRID_COUNT))
+
+STARTING_DIAG_DOWN_RIGHT = STARTING_HOR.union(STARTING_VER)
+
+STARTING_DIAG_UP_RIGHT = STARTING_HOR.union(set((i, GRID_COUNT-1) for i in range(GRID_COUNT)))
+
+DIR_HOR = 0
+DIR_VER = 1
+DIR_DIAG_DOWN_RIGHT = 2
+DIR_DIAG_UP_RIGHT = 3
+
+DIRS = [DIR_HOR, DIR_VER, DIR_DIAG_DOWN_RIGHT, DIR_DIAG_UP_RIGHT]
+COLORS = [BLACK, WHITE]
+
+DIR_TO_DELTA = {
+    DIR_HOR: (1, 0),
+    DIR_VER: (0, 1),
+    DIR_DIAG_DOWN_RIGHT: (1, 1),
+    DIR_DIAG_UP_RIGHT: (1, -1)
+}
+
+DIR_TO_STARTING = {
+    DIR_HOR: STARTING_HOR,
+    DIR_VER: STARTING_VER,
+    DIR_DIAG_DOWN_RIGHT: STARTING_DIAG_DOWN_RIGHT,
+    DIR_DIAG_UP_RIGHT: STARTING_DIAG_UP_RIGHT
+}
+
+class ConsecutiveLine:
+    def __init__(self, start, end, start_open_end, end_open_end, dir, color, num_consecutive):
+        self.start = start
+        self.end = end
+        self.start_open_end = start_open_end
+        self.end_open_end = end_open_end
+        self.dir = dir
+        self.color = color
+        self.cached_scores = None
+
+        self.num_consecutive = num_consecutive
+        self.num_open_ends = len(self.get_open_ends())
+
+    def check(self, grid):
+        dx, dy = DIR_TO_DELTA[self.dir]
+        x, y = self.start
+
+        if self.num_open_ends == 0 and self.num_consecutive < 5:
+            raise ValueError("We shouldn't store consecutive useless lines without open ends")
+
+        for i in range(self.num_consecutive):
+            if grid[x][y] != self.color:
+                raise ValueError('Incorrect Consecutive Line')
+            x += dx
+            y += dy
+
+        if (x-dx, y-dy) != self.end:
+            raise ValueError('Incorrect end')
+
+        def is_within_bounds(x, y):
+            return 0 <= x < GRID_COUNT and 0 <= y < GRID_COUNT
+
+        def safe_is_empty(x, y):
+            return is_within_bounds(x, y) and grid[x][y] == EMPTY
+
+        def safe_check(x, y, col):
+            return is_within_bounds(x, y) and grid[x][y] == col
+
+        num_open_ends = 0
+
+        if self.start_open_end:
+            num_open_ends += 1
+            if not safe_is_empty(self.start[0]-dx, self.start[1] - dy):
+                raise ValueError('Incorrect Consecutive Line (Start end not EMPTY)')
+        else:
+            if safe_check(self.start[0]-dx, self.start[1]-dy, self.color):
+                raise ValueError('Incorrect Consecutive Line (Start end this line color)')
+
+        if self.end_open_end:
+            num_open_ends += 1
+
+            if not safe_is_empty(self.end[0] + dx, self.end[1] + dy):
+                raise ValueError('Incorrect Consecutive Line (End not EMPTY)')
+        else:
+            if safe_check(self.end[0] + dx, self.end[1] + dy, self.color):
+                raise ValueError('Incorrect Consecutive Line (End this line color)')
+
+        if num_open_ends != self.num_open_ends:
+            raise ValueError('Incorrect stored value of num_open_ends')
+
+    def get_open_ends(self):
+        dx, dy = DIR_TO_DELTA[self.dir]
+        res = []
+        if self.start_open_end:
+            res.append((self.start[0] - dx, self.start[1] - dy))
+
+        if self.end_open_end:
+            res.append((self.end[0] + dx, self.end[1] + dy))
+
+        return res
+
+    def is_starting_end(self, x, y):
+        dx, dy = DIR_TO_DELTA[self.dir]
+        return self.start_open_end and (self.start[0] - dx, self.start[1] - dy) == (x, y)
+
+    def _calc_score(self, current_turn):
+        if self.num_consecutive > 4:
+            return 200000000
+        elif self.num_consecutive == 4:
+            if self.num_open_ends == 1:
+                if current_turn:
+                    return 100000000
+                return 50
+            elif self.num_open_ends == 2:
+                if current_turn:
+                    return 100000000
+                return 500000
+        elif self.num_consecutive == 3:
+            if self.num_open_ends == 1:
+                if current_turn:
+                    return 7
+                return 5
+            elif self.num_open_ends == 2:
+                if current_turn:
+                    return 10000
+                return 50
+        elif self.num_consecutive == 2:
+            if self.num_open_ends == 1:
+                return 2
+            else:
+                return 5
+        elif self.num_consecutive == 1:
+            if self.num_open_ends == 1:
+                return 0.5
+            else:
+                return 1
+        raise ValueError('We should never reach this')
+
+    def turn_scores(self):
+        # Score while the other color is to move, and while this color is to move
+        if self.cached_scores is None:
+            if self.num_open_ends == 0 and self.num_consecutive < 5:
+                raise ValueError("We shouldn't store consecutive useless lines without open ends")
+
+            self.cached_scores = (self._calc_score(False), self._calc_score(True))
+        return self.cached_scores
+
+    def score(self, this_turn_color):
+        current_turn = self.color == this_turn_color
+        return self.turn_scores()[current_turn]
+
+    def get_open_start(self):
+        dx, dy = DIR_TO_DELTA[self.dir]
+
+        if not self.start_open_end:
+            ValueError('There is no open start')
+        return self.start[0] - dx, self.start[1] - dy
+
+    def get_open_end(self):
+        dx, dy = DIR_TO_DELTA[self.dir]
+
+        if not self.end_open_end:
+            ValueError('There is no open end')
+        return self.end[0] + dx, self.end[1] + dy
+
+
+def other_color(color):
+    if color == BLACK:
+        return WHITE
+    return BLACK
+
+
+class Heuristic:
+    def __init__(self, simulator, should_reset=True):
+        self.simulator = simulator
+        self.score = {BLACK: 0, WHITE: 0}
+        # Per color, the sum of its line scores while the other color is to
+        # move and while it is to move, see update_score()
+        self.turn_sums = {BLACK: [0, 0], WHITE: [0, 0]}
+        self.lines = {}
+        self.open_end_dicts = {}
+        self.owned = set() # (dir, color) pairs whose lines and open ends are not shared
+        # The lines of every direction by (color, num_consecutive, num_open_ends),
+        # each bucket a dict used as an ordered set, see bucket()
+        self.buckets = {}
+        self.owned_buckets = set() # keys of the buckets that are not shared
+        if should_reset:
+            self.reset()
+
+    @staticmethod
+    def create_from_heuristic(old_heuristic, new_simulator):
+        # Shares every line list and open end dict with old_heuristic, see own()
+        new_heuristic = Heuristic(new_simulator, False)
+
+        new_heuristic.score = dict(old_heuristic.score)
+        new_heuristic.turn_sums = {color: list(old_heuristic.turn_sums[color]) for color in COLORS}
+        for dir in DIRS:
+            new_heuristic.lines[dir] = dict(old_heuristic.lines[dir])
+            new_heuristic.open_end_dicts[dir] = dict(old_heuristic.open_end_dicts[dir])
+        new_heuristic.buckets = dict(old_heuristic.buckets)
+
+        # Both heuristics now have to copy before writing
+        old_heuristic.owned = set()
+        old_heuristic.owned_buckets = set()
+
+        return new_heuristic
+
+    def reset(self):
+        # Construct list of consecutive stones of a color and open ends
+        for dir in DIRS:
+            self.lines[dir] = {}
+            self.open_end_dicts[dir] = {}
+            for color in COLORS:
+                discovered_lines, open_ends_dict = self.find_consecutive_dir(color, dir)
+                self.lines[dir][color] = discovered_lines
+                self.open_end_dicts[dir][color] = open_ends_dict
+                self.owned.add((dir, color))
+
+        self.update_score()
+
+    def find_consecutive_dir(self, color, dir):
+
+        starting = DIR_TO_STARTING[dir]
+        dx, dy = DIR_TO_DELTA[dir]
+
+        grid = self.simulator.state()[1]
+        count_consecutive = 0
+
+        discovered_lines = []
+        open_ends_dict = {}
+
+        starting_open_end = False
+        start_coords = None
+        end_coords = None
+
+        def add_line(is_ending_open_end):
+            # Do not record, this is a dead line, won't ever be useful
+            if count_consecutive < 5 and not starting_open_end and not is_ending_open_end:
+                return
+
+            line = ConsecutiveLine(start_coords, end_coords, starting_open_end, is_ending_open_end, dir, color, count_consecutive)
+            discovered_lines.append(line)
+
+            # Add open ends to open end map
+            open_ends = line.get_open_ends()
+            for open_end in open_ends:
+                if open_end not in open_ends_dict:
+                    open_ends_dict[open_end] = [line]
+                else:
+                    open_ends_dict[open_end].append(line)
+
+            # Add score
+            self.add_line_score(line)
+
+        def is_within_bounds(x, y):
+            return 0 <= x < GRID_COUNT and 0 <= y < GRID_COUNT
+
+        for sx, sy in starting:
+            x, y = sx, sy
+
+            while is_within_bounds(x, y):
+                # Do a linear pass starting at sx, sy and incrementing by dx, dy
+                if grid[x][y] == color:
+                    if count_consecutive == 0:
+                        start_coords = (x, y)
+                    count_consecutive += 1
+                elif grid[x][y] == EMPTY and count_consecutive > 0:
+                    end_coords = (x-dx, y-dy)
+                    add_line(True)
+                    count_consecutive = 0
+
+                    starting_open_end = True
+                elif grid[x][y] == EMPTY:
+                    starting_open_end = True
+                elif count_consecutive > 0:
+                    end_coords = (x-dx, y-dy)
+                    add_line(False)
+                    count_consecutive = 0
+                    starting_open_end = False
+                else:
+                    starting_open_end = False
+                x += dx
+                y += dy
+
+            if count_consecutive > 0:
+                end_coords = (x - dx, y - dy)
+                add_line(False)
+
+            count_consecutive = 0
+            starting_open_end = False
+
+        return discovered_lines, open_ends_dict
+
+    def own(self, dir, color):
+        # Copy-on-write: a heuristic created from another one shares its line
+        # lists and open end dicts until it first changes them. Open end lists
+        # and ConsecutiveLine objects are never changed once indexed, they are
+        # replaced instead, so copying these two containers is enough.
+        if (dir, color) not in self.owned:
+            self.lines[dir][color] = list(self.lines[dir][color])
+            self.open_end_dicts[dir][color] = dict(self.open_end_dicts[dir][color])
+            self.owned.add((dir, color))
+        return self.lines[dir][color], self.open_end_dicts[dir][color]
+
+    def own_bucket(self, key):
+        # Copy-on-write for buckets, like own()
+        if key not in self.owned_buckets:
+            self.buckets[key] = dict(self.buckets.get(key, {}))
+            self.owned_buckets.add(key)
+        return self.buckets[key]
+
+    def bucket(self, color, num_consecutive, num_open_ends):
+        # Lines of color in any direction with that many stones and open ends
+        return self.buckets.get((color, num_consecutive, num_open_ends), {})
+
+    def place(self, x, y):
+
+        # Plays the move on the simulator too, unless the caller already did
+        grid = self.simulator.state()[1]
+        if grid[x][y] == EMPTY:
+            self.simulator.place(x, y)
+
+        new_color = other_color(self.simulator.state()[0])
+
+        def is_within_bounds(x, y):
+            return 0 <= x < GRID_COUNT and 0 <= y < GRID_COUNT
+
+        def safe_is_empty(x, y):
+            return is_within_bounds(x, y) and grid[x][y] == EMPTY
+
+        def safe_is_color(x, y, col):
+            return is_within_bounds(x, y) and grid[x][y] == col
+
+        def append_to_dict(d, k, v):
+            d[k] = d.get(k, []) + [v]
+
+        def replace_in_dict(d, k, old, new):
+            d[k] = [new if l is old else l for l in d[k]]
+
+        def replace_line(lines, d, old, new, skipped_end):
+            # Swap old for new in the line list and in the open ends old still owns.
+            # The caller adds the score of new once it knows new is kept.
+            self.remove_line_score(old)
+            lines[lines.index(old)] = new
+            for open_end in old.get_open_ends():
+                if open_end != skipped_end:
+                    replace_in_dict(d, open_end, old, new)
+
+        def should_remove_line(l):
+            return l.num_open_ends < 1 and l.num_consecutive < 5
+
+        # Handle first the same that we are placing
+        for dir in DIRS:
+            open_dict = self.open_end_dicts[dir][new_color]
+            dx, dy = DIR_TO_DELTA[dir]
+            if (x, y) in open_dict and len(open_dict[(x, y)]) > 0:
+                # The point we are updating is already an end
+                lines = open_dict[(x, y)]
+                color_lines, open_dict = self.own(dir, new_color)
+
+                if len(lines) == 1:
+                    # Only open end of one part, no need to merge
+                    line = lines[0]
+
+                    open_dict[(x, y)] = []
+
+                    if line.is_starting_end(x, y):
+                        has_open_start = safe_is_empty(x-dx, y-dy)
+                        new_line = ConsecutiveLine((x, y), line.end, has_open_start, line.end_open_end,
+                                                   dir, new_color, line.num_consecutive + 1)
+                        if has_open_start:
+                            append_to_dict(open_dict, (x-dx, y-dy), new_line)
+                        elif safe_is_color(x-dx, y-dy, new_color):
+                            raise ValueError("len(lines)=1, this shouldn't happen")
+
+                    else:
+                        has_open_end = safe_is_empty(x+dx, y+dy)
+                        new_line = ConsecutiveLine(line.start, (x, y), line.start_open_end, has_open_end,
+                                                   dir, new_color, line.num_consecutive + 1)
+                        if has_open_end:
+                            append_to_dict(open_dict, (x + dx, y + dy), new_line)
+                        elif safe_is_color(x + dx, y + dy, new_color):
+                            raise ValueError("len(lines)=1, this shouldn't happen")
+
+                    replace_line(color_lines, open_dict, line, new_line, (x, y))
+
+                    if should_remove_line(new_line):
+                        # Remove this line
+                        color_lines.remove(new_line)
+                    else:
+                        self.add_line_score(new_line)
+                else:
+                    # Open end to two different lines, we need to merge them
+
+                    # We find the minimum depending on the direction we're looking at and put in minimum, put the
+                    # other on maximum
+                    minimum : ConsecutiveLine = lines[0]
+                    maximum : ConsecutiveLine = lines[1]
+
+                    order_index = 0
+                    if dir == DIR_VER:
+                        order_index = 1
+
+                    if maximum.start[order_index] < minimum.start[order_index]:
+                        minimum, maximum = maximum, minimum
+
+                    # Merge minimum and maximum into a new line
+                    color_lines.remove(minimum)
+                    color_lines.remove(maximum)
+                    self.remove_line_score(minimum)
+                    self.remove_line_score(maximum)
+
+                    new_line = ConsecutiveLine(
+                        minimum.start,
+                        maximum.end,
+                        minimum.start_open_end,
+                        maximum.end_open_end,
+                        dir,
+                        new_color,
+                        1+minimum.num_consecutive + maximum.num_consecutive
+                    )
+
+                    if minimum.start_open_end:
+                        open_start = minimum.get_open_start()
+                        open_dict[open_start] = [l for l in open_dict[open_start] if l is not minimum] + [new_line]
+
+                    if maximum.end_open_end:
+                        open_end = maximum.get_open_end()
+                        open_dict[open_end] = [l for l in open_dict[open_end] if l is not maximum] + [new_line]
+
+                    open_dict[(x, y)] = []
+
+                    if not should_remove_line(new_line):
+                        color_lines.append(new_line)
+                        self.add_line_score(new_line)
+
+            else:
+                # This point is isolated in this direction, add it anyway
+                has_open_start = safe_is_empty(x-dx, y-dy)
+                has_open_end = safe_is_empty(x+dx, y+dy)
+
+                if has_open_start or has_open_end:
+                    line = ConsecutiveLine((x, y), (x, y), has_open_start, has_open_end, dir, new_color, 1)
+
+                    color_lines, open_dict = self.own(dir, new_color)
+                    color_lines.append(line)
+                    self.add_line_score(line)
+
+                    open_dict[(x, y)] = []
+
+                    if has_open_start:
+                        append_to_dict(open_dict, line.get_open_start(), line)
+
+                    if has_open_end:
+                        append_to_dict(open_dict, line.get_open_end(), line)
+
+        opposite_color = other_color(new_color)
+
+        # Handle the opposite color
+        for dir in DIRS:
+            open_dict = self.open_end_dicts[dir][opposite_color]
+            if (x, y) in open_dict and len(open_dict[(x, y)]) > 0:
+                # The point we are updating is already an end
+                lines = open_dict[(x, y)]
+                color_lines, open_dict = self.own(dir, opposite_color)
+
+                def should_remove_line_after_removing_end(l):
+                    return l.num_open_ends <= 1 and l.num_consecutive < 5
+
+                lines_to_delete = [line for line in lines if should_remove_line_after_removing_end(line)]
+                lines = [line for line in lines if not should_remove_line_after_removing_end(line)]
+
+                # Delete all reference to the old line
+                for line in lines_to_delete:
+                    color_lines.remove(line)
+                    self.remove_line_score(line)
+
+                # Replace still remaining lines by ones with one less open end
+                for line in lines:
+                    if line.is_starting_end(x, y):
+                        new_line = ConsecutiveLine(line.start, line.end, False, line.end_open_end,
+                                                   dir, opposite_color, line.num_consecutive)
+                    else:
+                        new_line = ConsecutiveLine(line.start, line.end, line.start_open_end, False,
+                                                   dir, opposite_color, line.num_consecutive)
+                    replace_line(color_lines, open_dict, line, new_line, (x, y))
+                    self.add_line_score(new_line)
+
+                open_dict[(x, y)] = []
+
+        self.update_score()
+
+    # Every line kept in self.lines goes through these two, which add it to
+    # or take it out of the score sums and its bucket
+    def add_line_score(self, line):
+        waiting_score, to_move_score = line.turn_scores()
+        sums = self.turn_sums[line.color]
+        sums[0] += waiting_score
+        sums[1] += to_move_score
+        self.own_bucket((line.color, line.num_consecutive, line.num_open_ends))[line] = None
+
+    def remove_line_score(self, line):
+        waiting_score, to_move_score = line.turn_scores()
+        sums = self.turn_sums[line.color]
+        sums[0] -= waiting_score
+        sums[1] -= to_move_score
+        del self.own_bucket((line.color, line.num_consecutive, line.num_open_ends))[line]
+
+    # Picks, for each color, the sum matching whether it is the one to move
+    def update_score(self):
+        color_to_move = self.simulator.state()[0]
+        for color in COLORS:
+            self.score[color] = self.turn_sums[color][color == color_to_move]
+
+    # Full pass over every line, place() keeps the score up to date without it
+    def recalculate_score(self):
+        self.score[BLACK] = 0
+        self.score[WHITE] = 0
+
+        for color in COLORS:
+            for dir in DIRS:
+                for line in self.lines[dir][color]:
+                    self.score[color] += line.score(self.simulator.state()[0])
+
+    def check(self):
+        grid = self.simulator.state()[1]
+
+        for color in COLORS:
+            for dir in DIRS:
+                for line in self.lines[dir][color]:
+                    line.check(grid)
+                    open_ends = line.get_open_ends()
+                    if len(open_ends) == 0 and line.num_consecutive < 5:
+                        raise ValueError("Storing line with 0 open-ends")
+                    open_dict = self.open_end_dicts[dir][color]
+                    for open_end in open_ends:
+                        if open_end not in open_dict:
+                            raise ValueError('Open end not registered')
+
+                        if line not in open_dict[open_end]:
+                            raise ValueError('Line not registered in Open End')
+
+        # Check open grid
+        for color in COLORS:
+            for dir in DIRS:
+                dx, dy = DIR_TO_DELTA[dir]
+
+                open_dict = self.open_end_dicts[dir][color]
+
+                for (x, y), lines in open_dict.items():
+                    if len(lines) == 0:
+                        continue
+
+                    if len(lines) > 2:
+                        raise ValueError('At most 2 lines could have the same endpoint')
+
+                    if grid[x][y] != EMPTY:
+                        raise ValueError('Open end is not EMPTY in grid')
+
+                    for line in lines:
+                        if (x, y) == (line.start[0] - dx, line.start[1] - dy):
+                            if not line.start_open_end:
+                                raise ValueError('Line does not have open start end')
+                        elif (x, y) == (line.end[0] + dx, line.end[1] + dy):
+                            if not line.end_open_end:
+                                raise ValueError('Line does not have open end')
+                        else:
+                            raise ValueError("Open dict points to line to whom it's not neither start or end point")
+
+        # Check incrementally maintained score
+        color_to_move = self.simulator.state()[0]
+        expected_score = {BLACK: 0, WHITE: 0}
+        for color in COLORS:
+            for dir in DIRS:
+                for line in self.lines[dir][color]:
+                    expected_score[color] += line.score(color_to_move)
+
+        if expected_score != self.score:
+            raise ValueError('Incremental score differs from a full recalculation')
+
+        # Check buckets
+        expected_buckets = {}
+        for color in COLORS:
+            for dir in DIRS:
+                for line in self.lines[dir][color]:
+                    key = (color, line.num_consecutive, line.num_open_ends)
+                    expected_buckets.setdefault(key, set()).add(line)
+
+        for key in set(expected_buckets) | set(self.buckets):
+            bucket = self.buckets.get(key, {})
+            if set(bucket) != expected_buckets.get(key, set()):
+                raise ValueError(f'Bucket {key} differs from the lines')
+
+    def five_cells(self, color):
+        # Empty cells where a stone of color makes five in a row: the lines
+        # ending right next to the cell in one direction add up to four
+        cells = set()
+        for dir in DIRS:
+            for cell, lines in self.open_end_dicts[dir][color].items():
+                if sum(line.num_consecutive for line in lines) >= 4:
+                    cells.add(cell)
+        return cells
+
+    def new_five_cells(self, x, y):
+        # The five cells the stone on (x, y) adds for its color. Any of them
+        # is an open end of a line through (x, y), so only those are looked up.
+        grid = self.simulator.state()[1]
+        color = grid[x][y]
+        cells = set()
+        for dir in DIRS:
+            dx, dy = DIR_TO_DELTA[dir]
+            for step in [1, -1]:
+                i, j = x + step * dx, y + step * dy
+                while 0 <= i < GRID_COUNT and 0 <= j < GRID_COUNT and grid[i][j] == color:
+                    i, j = i + step * dx, j + step * dy
+
+                lines = self.open_end_dicts[dir][color].get((i, j))
+                if lines and sum(line.num_consecutive for line in lines) >= 4:
+                    cells.add((i, j))
+        return cells
+
+    def get_value_for_player(self, color):
+        return self.score[color] - self.score[other_color(color)]
+
+    def get_possible_actions(self, actions):
+        color = self.simulator.state()[0]
+
+        # Check for forced wins
+        for num_open_ends in [1, 2]:
+            for line in self.bucket(color, 4, num_open_ends):
+                return [line.get_open_ends()[0]]
+
+        # TODO: Only return forced wins / forced defenses
+        forced_defenses = []
+        for num_open_ends in [1, 2]:
+            for line in self.bucket(other_color(color), 4, num_open_ends):
+                forced_defenses += line.get_open_ends()
+
+        if len(forced_defenses) > 0:
+            return forced_defenses
+
+        return actions
@@ -0,0 +1,122 @@
+from __future__ import absolute_import, division, print_function
+
+from game import GRID_COUNT, EMPTY
+from heuristic import DIRS, COLORS, DIR_TO_DELTA
+
+# Weight of every legal cell, and what each line with an open end on the
+# cell adds to it per open end it has, by the line's number of stones
+BASE_WEIGHT = 1
+LINE_WEIGHTS = {1: 1, 2: 4, 3: 16, 4: 256}
+
+NUM_CELLS = GRID_COUNT * GRID_COUNT
+
+class WeightTree:
+    """Integer weights of the cells, r * GRID_COUNT + c, in a Fenwick tree:
+    changing one weight and drawing a cell with probability proportional
+    to its weight are both O(log n). Weights are integers so that the sums
+    stay exact however many updates they go through, and a cell of weight
+    0 is never drawn.
+    """
+
+    def __init__(self, size=NUM_CELLS):
+        self.size = size
+        self.weights = [0] * size
+        self.tree = [0] * (size + 1)
+        self.top = 1 # highest power of two <= size
+        while self.top * 2 <= size:
+            self.top *= 2
+
+    def set(self, i, weight):
+        delta = weight - self.weights[i]
+        if delta == 0:
+            return
+        self.weights[i] = weight
+        i += 1
+        tree = self.tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        # Sum of the prefixes covering every index
+        i = self.size
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, value):
+        # Index whose weight covers value, 0 <= value < total(), by binary
+        # lifting: the first index with a prefix sum above value
+        tree = self.tree
+        pos = 0
+        step = self.top
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] <= value:
+                pos = nxt
+                value -= tree[nxt]
+            step >>= 1
+        return pos
+
+class RolloutPolicy:
+    """Rollout moves drawn in proportion to how much the lines around them
+    matter. A legal cell weighs BASE_WEIGHT plus LINE_WEIGHTS of every line
+    of either color it is an open end of, read from the Heuristic's
+    open_end_dicts, so extending or blocking a three is far likelier than a
+    move away from the stones.
+
+    Only the cells a move can change are reweighed after it, see place().
+    """
+
+    def __init__(self, simulator, heuristic):
+        self.simulator = simulator
+        self.heuristic = heuristic
+        self.weights = WeightTree()
+        for action in simulator.get_actions():
+            self.update(action)
+
+    def weight(self, cell):
+        if cell not in self.simulator.actions:
+            return 0
+
+        weight = BASE_WEIGHT
+        for dir in DIRS:
+            for color in COLORS:
+                for line in self.heuristic.open_end_dicts[dir][color].get(cell, ()):
+                    weight += LINE_WEIGHTS[min(line.num_consecutive, 4)] * line.num_open_ends
+        return weight
+
+    def update(self, cell):
+        self.weights.set(cell[0] * GRID_COUNT + cell[1], self.weight(cell))
+
+    def sample(self, rng):
+        # A legal move drawn with rng, a random.Random or the random module
+        return divmod(self.weights.find(rng.randrange(self.weights.total())), GRID_COUNT)
+
+    def place(self, x, y, num_slots):
+        # Reweighs after the heuristic has played (x, y). num_slots is the
+        # number of slots of simulator.actions before the move, the slots past
+        # it are the cells the move made legal. The lines that changed are
+        # the runs of stones next to (x, y), so only the cells right past
+        # their ends have new open ends.
+        grid = self.simulator.state()[1]
+        self.update((x, y))
+        for cell in self.simulator.actions.slots[num_slots:]:
+            self.update(cell)
+
+        for dir in DIRS:
+            dx, dy = DIR_TO_DELTA[dir]
+            for step in [1, -1]:
+                i, j = x + step * dx, y + step * dy
+                if not (0 <= i < GRID_COUNT and 0 <= j < GRID_COUNT):
+                    continue
+
+                color = grid[i][j]
+                if color != EMPTY:
+                    while 0 <= i < GRID_COUNT and 0 <= j < GRID_COUNT and grid[i][j] == color:
+                        i, j = i + step * dx, j + step * dy
+                    if not (0 <= i < GRID_COUNT and 0 <= j < GRID_COUNT):
+                        continue
+                self.update((i, j))
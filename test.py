@@ -65,6 +65,10 @@ def deterministic_test():
 #MIN_WINS = 9
 NUM_PLAYS = 100
 
+# Whether the new AI stops searching early, see ai.AI.early_stopping. Off to
+# measure the AI main.py plays.
+EARLY_STOPPING = False
+
 def win_test():
     simulator = Game()
     wins = 0
@@ -76,6 +80,8 @@ def win_test():
     max_time_new = -10000
     max_time_old = -10000
     started_by_new_ai = 0
+    sum_inherited = 0
+    sum_saved = 0
 
     for play_i in range(NUM_PLAYS):
         print("play {}/{}".format(play_i + 1, NUM_PLAYS))
@@ -90,13 +96,19 @@ def win_test():
             new_ai_color = WHITE
             print('Stock AI starts the game')
 
+        new_ai = None
         move_index = 0
         while not simulator.game_over:
             #print(f'Move {move_index}')
             if ai_play:
                 start_time = time.time()
-                ai_player = ai.AI(simulator.state())
-                (r,c), _ = ai_player.mcts_search()
+                if new_ai is None:
+                    new_ai = ai.AI(simulator.state())
+                    new_ai.early_stopping = EARLY_STOPPING
+                else:
+                    sum_inherited += new_ai.follow(simulator.state())
+                (r,c), _ = new_ai.mcts_search()
+                sum_saved += new_ai.iters_saved
                 move_time = time.time() - start_time
                 sum_time_new += move_time
                 num_moves_new += 1
@@ -123,6 +135,8 @@ def win_test():
 
     print(f'Average move time new: {sum_time_new / num_moves_new} seconds')
     print(f'Max move time new: {max_time_new} seconds')
+    print(f'Average visits inherited per move new: {sum_inherited / num_moves_new}')
+    print(f'Average iterations saved per move new: {sum_saved / num_moves_new}')
 
     print(f'Average move time old: {sum_time_old / num_moves_old} seconds')
     print(f'Max move time old: {max_time_old} seconds')
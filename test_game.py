@@ -0,0 +1,161 @@
+import copy
+import random
+from game import Game, ActionList, BLACK
+
+NUM_PLAYS = 1000
+
+class WalkGame(Game):
+    # Reference engine: the original check_win, walking the grid cell by cell
+    def check_win(self, r, c):
+        runs = [ self.continuous_count_both(r, c, -1, 0),
+                 self.continuous_count_both(r, c, 0, 1),
+                 self.continuous_count_both(r, c, 1, 1),
+                 self.continuous_count_both(r, c, -1, 1) ]
+
+        max_run = max(runs, key=lambda x: x[1])
+
+        if max_run[1] >= 5:
+            self.winner = self.grid[r][c]
+            self.game_over = True
+            self.winning_pos = max_run[0]
+
+def compare(bitboard_game, walk_game, move):
+    for attr in ['winner', 'game_over', 'winning_pos', 'player']:
+        if getattr(bitboard_game, attr) != getattr(walk_game, attr):
+            print(getattr(bitboard_game, attr))
+            print(getattr(walk_game, attr))
+            raise ValueError(f'Engines disagree on {attr} at move {move}')
+
+    # Reloading a grid lists the actions in a different order than playing it out
+    if set(bitboard_game.get_actions()) != set(walk_game.get_actions()):
+        raise ValueError(f'Engines disagree on actions at move {move}')
+
+def equivalence_check():
+    print('Checking bitboard engine against grid walk:')
+    bitboard_game = Game()
+
+    for play_i in range(NUM_PLAYS):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS))
+
+        bitboard_game.reset(BLACK)
+        walk_game = WalkGame(*bitboard_game.state())
+        compare(bitboard_game, walk_game, 0)
+
+        i = 0
+        while not walk_game.game_over:
+            (r, c) = random.choice(walk_game.get_actions())
+
+            bitboard_game.place(r, c)
+            walk_game.place(r, c)
+            compare(bitboard_game, walk_game, i)
+
+            # Reloading from the grid has to rebuild the same bitboards
+            compare(Game(*bitboard_game.state()), WalkGame(*walk_game.state()), i)
+            i += 1
+
+    print('Done')
+
+def saved_states_check():
+    print('Checking bitboard engine on test_states:')
+
+    with open("test_states") as file:
+        states = [state[:-1] for state in file.readlines()]
+
+    for state in states:
+        bitboard_game = Game()
+        bitboard_game.load_state_text(state)
+        walk_game = WalkGame()
+        walk_game.load_state_text(state)
+        compare(bitboard_game, walk_game, 0)
+
+    print('Done')
+
+def action_list_check():
+    print('Checking ActionList against list:')
+
+    cells = [(r, c) for r in range(11) for c in range(11)]
+
+    for play_i in range(NUM_PLAYS):
+        actions = list(cells[:random.randint(0, len(cells))])
+        action_list = ActionList(len(cells), actions)
+
+        for step in range(2 * len(cells)):
+            if len(actions) > 0 and (random.random() < 0.5 or len(action_list.slots) == len(cells)):
+                action = random.choice(actions)
+                actions.remove(action)
+                action_list.remove(action)
+            elif len(action_list.slots) < len(cells):
+                action = cells[len(action_list.slots)]
+                actions.append(action)
+                action_list.append(action)
+
+            if len(actions) != len(action_list) or list(action_list) != actions:
+                raise ValueError('ActionList order differs from list')
+
+            for i in range(len(actions)):
+                if action_list[i] != actions[i]:
+                    raise ValueError(f'ActionList differs from list at index {i}')
+
+    print('Done')
+
+def snapshot(game):
+    return (copy.deepcopy(game.grid), dict(game.bitboards), list(game.actions), game.player,
+            game.min_r, game.max_r, game.min_c, game.max_c,
+            game.winner, game.game_over, game.winning_pos, game.hash)
+
+def undo_check():
+    print('Checking push/pop:')
+    game = Game()
+
+    for play_i in range(NUM_PLAYS):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS))
+
+        game.reset(BLACK)
+        snapshots = []
+
+        while not game.game_over:
+            snapshots.append(snapshot(game))
+            game.push(*game.rand_move())
+
+            # Taking a move back and replaying it has to be a no-op
+            if random.random() < 0.3:
+                after = snapshot(game)
+                game.push(*game.pop())
+                if snapshot(game) != after:
+                    raise ValueError(f'Replaying move {len(snapshots) - 1} changed the game')
+
+        while len(snapshots) > 0:
+            game.pop()
+            if snapshot(game) != snapshots.pop():
+                raise ValueError(f'pop() did not restore move {len(snapshots)}')
+
+    print('Done')
+
+def zobrist_check():
+    print('Checking Zobrist hashes against reloaded positions:')
+    game = Game()
+    seen = {}
+
+    for play_i in range(NUM_PLAYS):
+        game.reset(BLACK)
+
+        while not game.game_over:
+            game.push(*game.rand_move())
+
+            reloaded = Game(game.player, game.grid)
+            if game.hash != reloaded.hash:
+                raise ValueError(f'Incremental hash differs from the reloaded one after {len(game.history)} moves')
+
+            # Different positions hashing the same would be shared by the search
+            position = (game.player, str(game.grid))
+            if seen.setdefault(game.hash, position) != position:
+                raise ValueError('Hash collision between two positions')
+
+    print('Done')
+
+if __name__ == '__main__':
+    action_list_check()
+    undo_check()
+    zobrist_check()
+    saved_states_check()
+    equivalence_check()
@@ -2,6 +2,7 @@ import copy
 import random
 from game import Game, WHITE, BLACK, GRID_COUNT
 import ai
+from rollout_policy import RolloutPolicy
 import time
 
 NUM_PLAYS = 1000
@@ -110,4 +111,120 @@ def line_check_incremental():
 
     print('Done')
 
+def five_cells_check():
+    print('Checking five cells:')
+    simulator = Game()
+
+    for play_i in range(NUM_PLAYS // 10):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS // 10))
+
+        simulator.reset(BLACK)
+        incremental_heuristic = ai.Heuristic(simulator)
+        five_cells = {BLACK: set(), WHITE: set()}
+
+        while not simulator.game_over:
+            player = simulator.player
+            for color in [BLACK, WHITE]:
+                # Cells where a stone of color makes five, found by trying every move
+                simulator.player = color
+                expected = set()
+                for action in list(simulator.get_actions()):
+                    simulator.push(*action)
+                    if simulator.winning_pos is not None:
+                        expected.add(action)
+                    simulator.pop()
+                simulator.player = player
+
+                if incremental_heuristic.five_cells(color) != expected:
+                    raise ValueError(f'Five cells disagree: {incremental_heuristic.five_cells(color)} {expected}')
+                if five_cells[color] != expected:
+                    raise ValueError(f'Five cells kept move by move disagree: {five_cells[color]} {expected}')
+
+            (r, c) = random.choice(simulator.get_actions())
+            incremental_heuristic.place(r, c)
+
+            # Same updates as the rollout of ai_update.AI
+            for color in [BLACK, WHITE]:
+                five_cells[color].discard((r, c))
+            five_cells[player] |= incremental_heuristic.new_five_cells(r, c)
+
+    print('Done')
+
+def rollout_policy_check():
+    print('Checking rollout policy weights:')
+    simulator = Game()
+
+    for play_i in range(NUM_PLAYS // 10):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS // 10))
+
+        simulator.reset(BLACK)
+        incremental_heuristic = ai.Heuristic(simulator)
+        policy = RolloutPolicy(simulator, incremental_heuristic)
+
+        while not simulator.game_over:
+            # Weights kept move by move against weights computed from scratch
+            fresh_policy = RolloutPolicy(simulator, incremental_heuristic)
+            if policy.weights.weights != fresh_policy.weights.weights:
+                raise ValueError('Incremental rollout weights differ from a full recalculation')
+            if policy.weights.total() != sum(fresh_policy.weights.weights):
+                raise ValueError('Rollout weight total is wrong')
+
+            (r, c) = policy.sample(random)
+            if (r, c) not in simulator.actions:
+                raise ValueError(f'Rollout policy drew the illegal move {(r, c)}')
+
+            num_slots = len(simulator.actions.slots)
+            incremental_heuristic.place(r, c)
+            policy.place(r, c, num_slots)
+
+    print('Done')
+
+def tree_check():
+    print('Checking inherited heuristics in the search tree:')
+    simulator = Game()
+    budget = ai.BUDGET
+    ai.BUDGET = 200
+
+    for play_i in range(NUM_PLAYS // 10):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS // 10))
+
+        simulator.reset(BLACK)
+        ai_player = ai.AI(simulator.state())
+        ai_player.progressive_widening = play_i % 2 == 1
+        ai_player.mcts_search()
+
+        nodes = [(ai_player.root, [])]
+        while len(nodes) > 0:
+            node, moves = nodes.pop()
+
+            replay_simulator = Game(*simulator.state())
+            for move in moves:
+                replay_simulator.place(*move)
+
+            fresh_heuristic = ai.Heuristic(replay_simulator)
+            if node.prior != fresh_heuristic.get_value_for_player(ai.other_color(node.player)):
+                raise ValueError(f'Prior disagrees with the heuristic after moves {moves}')
+
+            # Fully expanded nodes have released their heuristic
+            if node.heuristic is not None:
+                # check() needs a board at the node's state
+                node_simulator = node.heuristic.simulator
+                node.heuristic.simulator = replay_simulator
+                node.heuristic.check()
+                node.heuristic.simulator = node_simulator
+
+                if node.heuristic.score != fresh_heuristic.score:
+                    print(node.heuristic.score)
+                    print(fresh_heuristic.score)
+                    raise ValueError(f'Inherited heuristic disagrees after moves {moves}')
+
+            if ai_player.progressive_widening and len(node.children) > ai_player.max_children(node):
+                raise ValueError(f'Node has more children than its visits allow after moves {moves}')
+
+            for action, child in node.children:
+                nodes.append((child, moves + [action]))
+
+    ai.BUDGET = budget
+    print('Done')
+
 score_check()
\ No newline at end of file
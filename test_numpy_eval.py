@@ -0,0 +1,144 @@
+import io
+import random
+import numpy as np
+from game import Game, BLACK, WHITE
+from heuristic import Heuristic, DIRS, COLORS
+import numpy_eval
+import batch_rollout
+import ai
+import array_tree
+
+NUM_PLAYS = 200
+
+def describe_lines(heuristic):
+    lines = {}
+    for dir in DIRS:
+        for color in COLORS:
+            lines[(dir, color)] = [(line.start, line.end, line.start_open_end, line.end_open_end, line.num_consecutive)
+                                   for line in heuristic.lines[dir][color]]
+    return lines
+
+def equivalence_check():
+    print('Checking NumPy evaluator against Heuristic:')
+    simulator = Game()
+    boards = []
+    players = []
+    expected_scores = []
+
+    for play_i in range(NUM_PLAYS):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS))
+
+        simulator.reset(BLACK)
+        i = 0
+
+        while not simulator.game_over:
+            (r, c) = random.choice(simulator.get_actions())
+            simulator.place(r, c)
+
+            heuristic = Heuristic(simulator)
+            numpy_heuristic = numpy_eval.NumpyHeuristic(simulator)
+
+            if numpy_heuristic.score != heuristic.score:
+                print(numpy_heuristic.score)
+                print(heuristic.score)
+                raise ValueError(f'NumpyHeuristic score disagrees at move {i}')
+
+            if describe_lines(numpy_heuristic) != describe_lines(heuristic):
+                raise ValueError(f'NumpyHeuristic lines disagree at move {i}')
+
+            numpy_heuristic.check()
+
+            if numpy_eval.evaluate(simulator.grid, simulator.player) != heuristic.score:
+                raise ValueError(f'evaluate() disagrees at move {i}')
+
+            boards.append(numpy_eval.encode_board(simulator.grid))
+            players.append(simulator.player)
+            expected_scores.append(heuristic.score)
+            i += 1
+
+    print('Checking batch evaluation:')
+    scores = numpy_eval.evaluate_batch(np.array(boards), players)
+    for i in range(len(expected_scores)):
+        if scores[BLACK][i] != expected_scores[i][BLACK] or scores[WHITE][i] != expected_scores[i][WHITE]:
+            raise ValueError(f'evaluate_batch() disagrees on position {i}')
+
+    print('Done')
+
+def to_grid(board):
+    cell_to_stone = {numpy_eval.CELL_EMPTY: '.', numpy_eval.CELL_BLACK: BLACK, numpy_eval.CELL_WHITE: WHITE}
+    return [[cell_to_stone[cell] for cell in row] for row in board.tolist()]
+
+def batch_rollout_check():
+    print('Checking batched playouts against Game rules:')
+    rng = np.random.default_rng()
+    simulator = Game()
+
+    for play_i in range(NUM_PLAYS):
+        print("Play {}/{}".format(play_i + 1, NUM_PLAYS))
+        simulator.reset(BLACK)
+
+        boards = np.repeat(numpy_eval.encode_board(simulator.grid)[np.newaxis], 16, axis=0)
+        players = np.full(16, numpy_eval.CELL_BLACK, dtype=np.int8)
+        boxes = np.repeat(np.array([[simulator.min_r, simulator.max_r, simulator.min_c, simulator.max_c]]), 16, axis=0)
+        winners = batch_rollout.play_out_batch(boards, players, boxes, rng)
+
+        for board, winner in zip(boards, winners):
+            final_game = Game(BLACK, to_grid(board))
+            area_full = len(final_game.get_actions()) == 0
+
+            if area_full:
+                expected_winner = WHITE
+            elif final_game.winner is not None:
+                expected_winner = final_game.winner
+            else:
+                raise ValueError('Playout stopped before the game was over')
+
+            if batch_rollout.CELL_TO_COLOR[winner] != expected_winner:
+                raise ValueError('Playout reported the wrong winner')
+
+    print('Done')
+
+class TreeAI(ai.AI):
+    # ArrayAI has no transposition table, threat search or proven values,
+    # compare it against a plain tree
+    use_transpositions = False
+    threat_search = False
+    mcts_solver = False
+
+def array_tree_check():
+    print('Checking ArrayAI against ai.AI on test_states:')
+
+    with open("test_states") as file:
+        states = [state[:-1] for state in file.readlines()]
+
+    for state in states:
+        game = Game()
+        game.load_state_text(state)
+
+        # Both rollouts draw from rand_move, so with the same rollout_rng both
+        # searches visit the same nodes and have to agree on every UCB
+        node_ai = TreeAI(game.state())
+        action, UCBs = node_ai.mcts_search(ai.BUDGET)
+        array_ai = array_tree.ArrayAI(game.state())
+        array_action, array_UCBs = array_ai.mcts_search(ai.BUDGET)
+
+        if array_action != action or array_UCBs != UCBs:
+            raise ValueError('ArrayAI disagrees with ai.AI')
+
+        reloaded = array_tree.ArrayTree.load(save_to_buffer(array_ai.tree))
+        for name, array in array_ai.tree.arrays().items():
+            if not np.array_equal(getattr(reloaded, name)[:reloaded.size], array):
+                raise ValueError(f'Reloaded tree differs in {name}')
+
+    print('Done')
+
+def save_to_buffer(tree):
+    buffer = io.BytesIO()
+    tree.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+if __name__ == '__main__':
+    equivalence_check()
+    batch_rollout_check()
+    array_tree_check()
@@ -0,0 +1,221 @@
+from game import Game, BLACK, WHITE
+from heuristic import Heuristic
+import threats
+import ai
+
+# Tactical positions as (name, player to move, board, search VCT too,
+# whether the player to move has a forced win, the winning first moves if
+# they are known). Black is 'b' and white is 'w'.
+POSITIONS = [
+    ('four', BLACK, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . w . . .',
+        '. . b b b b w . . . .',
+        '. . . . . . w . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], False, True, [(5, 1)]),
+    ('gapped four', WHITE, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . b . . . . . . .',
+        '. . . b . . . . . . .',
+        '. . w w . w w . . . .',
+        '. . . b . . . . . . .',
+        '. . . b . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], False, True, [(5, 4)]),
+    ('open three', BLACK, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . b b b . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . w w w . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], False, True, None),
+    ('four-three', BLACK, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . b . . . .',
+        '. . . . . . b . . . .',
+        '. . w b b b . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . w . w . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], False, True, None),
+    ('must block', BLACK, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . b b b . . . . .',
+        '. . . . . . . . . . .',
+        '. . b w w w w . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], True, False, None),
+    ('double three', BLACK, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . b . . . .',
+        '. . . . . . b . . . .',
+        '. . . . b b . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . w w .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], True, True, None),
+    ('quiet', WHITE, [
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . b . . . . . .',
+        '. . . . . w . . . . .',
+        '. . . . . . b . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+        '. . . . . . . . . . .',
+    ], True, False, None),
+]
+
+# Black to move with a gapped five at (5, 5), while white has a four
+GAPPED_FIVE = [
+    '. . . . . . . . . . .',
+    '. . . . . . . . . . .',
+    '. . . . . . . . . . .',
+    '. . . . . . . . . . .',
+    '. . . . . . . . . . .',
+    '. . . b b . b b . . .',
+    '. . . . . . . . . . .',
+    '. . w w w w . . . . .',
+    '. . . . . . . . w . .',
+    '. . . . . . . . . . .',
+    '. . . . . . . . . . .',
+]
+
+SOLVE_TIME = 60
+
+def load(player, rows):
+    return Game(player, [row.split(' ') for row in rows])
+
+def wins_now(game):
+    # Whether the player to move can make five
+    for action in list(game.get_actions()):
+        game.push(*action)
+        won = game.game_over and game.winner != game.player
+        game.pop()
+        if won:
+            return True
+    return False
+
+def replay_check(game, sequence):
+    # A VCF sequence leaves the defender no choice: playing it out has to
+    # win, or end in a four the defender can't stop
+    player = game.player
+    for r, c in sequence:
+        if not game.push(r, c):
+            raise ValueError(f'Illegal move {(r, c)} in the winning sequence')
+
+    won = game.game_over and game.winner == player
+    if not game.game_over:
+        won = True
+        for action in list(game.get_actions()):
+            game.push(*action)
+            won = won and not game.game_over and wins_now(game)
+            game.pop()
+
+    game.rewind()
+    return won
+
+def positions_check():
+    print('Checking the threat solver on tactical positions:')
+
+    for name, player, rows, allow_threes, has_win, winning_moves in POSITIONS:
+        game = load(player, rows)
+        grid = [list(row) for row in game.grid]
+
+        # Only the node limit applies, a slow machine shouldn't change the results
+        vcf = threats.ThreatSearch(game, Heuristic(game), max_time=SOLVE_TIME).solve(False)
+        sequence = threats.ThreatSearch(game, Heuristic(game), max_time=SOLVE_TIME).solve(allow_threes)
+
+        if game.grid != grid or len(game.history) > 0:
+            raise ValueError(f'{name}: the solver did not restore the board')
+        if (sequence is not None) != has_win:
+            raise ValueError(f'{name}: expected {"a" if has_win else "no"} forced win, got {sequence}')
+        if has_win and winning_moves is not None and sequence[0] not in winning_moves:
+            raise ValueError(f'{name}: {sequence[0]} is not one of the winning moves {winning_moves}')
+        if vcf is not None and not replay_check(game, vcf):
+            raise ValueError(f'{name}: VCF sequence {vcf} does not win')
+
+    print('Done')
+
+def limits_check():
+    print('Checking the threat solver limits:')
+    name, player, rows = POSITIONS[5][:3]
+    game = load(player, rows)
+    grid = [list(row) for row in game.grid]
+
+    # The double three needs several positions of search
+    search = threats.ThreatSearch(game, Heuristic(game), max_nodes=3)
+    if search.solve(True) is not None:
+        raise ValueError('The solver went past its node limit')
+    if game.grid != grid or len(game.history) > 0:
+        raise ValueError('Giving up did not restore the board')
+
+    search = threats.ThreatSearch(game, Heuristic(game), max_time=0)
+    if search.solve(True) is not None or search.num_nodes > threats.TIME_CHECK_INTERVAL:
+        raise ValueError('The solver went past its time limit')
+
+    print('Done')
+
+def solver_check():
+    print('Checking proven values in the search:')
+
+    for name, player, rows, allow_threes, has_win, winning_moves in POSITIONS[:2]:
+        # Without the threat search the win has to be proven by the tree itself
+        ai_player = ai.AI((player, load(player, rows).grid))
+        ai_player.threat_search = False
+        action, _ = ai_player.mcts_search(1000)
+
+        if ai_player.root.proven != player or action not in winning_moves:
+            raise ValueError(f'{name}: the search did not prove the win')
+        if ai_player.num_iters == 1000:
+            raise ValueError(f'{name}: the search went on after proving the root')
+
+    # Black's gapped five isn't among the replies to white's four that
+    # get_possible_actions keeps, so without the threat search the root must
+    # not be proven lost
+    ai_player = ai.AI((BLACK, load(BLACK, GAPPED_FIVE).grid))
+    ai_player.threat_search = False
+    ai_player.mcts_search(300)
+    if ai_player.root.proven == WHITE:
+        raise ValueError('The search proved a position with a winning move lost')
+
+    print('Done')
+
+if __name__ == '__main__':
+    positions_check()
+    limits_check()
+    solver_check()
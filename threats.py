@@ -0,0 +1,228 @@
+from __future__ import absolute_import, division, print_function
+
+import time
+from game import GRID_COUNT, BIT_STRIDE, cell_bit
+from heuristic import Heuristic, DIRS, DIR_TO_DELTA, other_color
+
+# Limits of one solve(): positions searched and seconds spent. Running out
+# of either gives up and reports no win.
+MAX_NODES = 1000
+MAX_TIME = 0.1
+
+# Depth limits, in attacker moves
+MAX_VCF_DEPTH = 10
+MAX_VCT_DEPTH = 4
+
+# The clock is read once every this many positions
+TIME_CHECK_INTERVAL = 32
+
+def _build_windows():
+    # WINDOWS[r][c] holds the bitboard mask of every five cells in a row
+    # through (r, c), in any direction
+    windows = [[[] for c in range(GRID_COUNT)] for r in range(GRID_COUNT)]
+    for dir in DIRS:
+        dx, dy = DIR_TO_DELTA[dir]
+        for r in range(GRID_COUNT):
+            for c in range(GRID_COUNT):
+                cells = [(r + i * dx, c + i * dy) for i in range(5)]
+                if all(0 <= x < GRID_COUNT and 0 <= y < GRID_COUNT for x, y in cells):
+                    mask = 0
+                    for x, y in cells:
+                        mask |= cell_bit(x, y)
+                    for x, y in cells:
+                        windows[x][y].append(mask)
+    return windows
+
+WINDOWS = _build_windows()
+
+def bit_to_cell(bit):
+    return divmod(bit.bit_length() - 1, BIT_STRIDE)
+
+class SearchLimit(Exception):
+    pass
+
+class ThreatSearch:
+    """Threat-space search for a forced win of the player to move.
+
+    VCF (victory by continuous fours) only plays fours, which leave the
+    defender a single reply. VCT (victory by continuous threats) also plays
+    threes, moves after which the attacker could make an open four, and
+    then has to win against every reply that stops it, including the
+    defender's own fours. Both are sound: a returned move wins against any
+    defence. They are not complete, the node and time limits can end the
+    search before a win is found.
+
+    Candidate moves come from the open ends in the Heuristic's line indexes,
+    every four or three is made within two cells of stones already in line.
+    Fours and fives are told apart with the simulator's bitboards.
+    """
+
+    def __init__(self, simulator, heuristic, max_nodes=MAX_NODES, max_time=MAX_TIME):
+        self.simulator = simulator
+        self.heuristic = heuristic
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.num_nodes = 0
+        self.deadline = None
+
+    def solve(self, allow_threes=False):
+        # Winning move sequence of the player to move, starting with the move to
+        # play now, or None. The simulator is left at the position it started.
+        if self.simulator.game_over:
+            return None
+
+        depth = MAX_VCT_DEPTH if allow_threes else MAX_VCF_DEPTH
+        self.num_nodes = 0
+        self.deadline = time.time() + self.max_time
+        history_length = len(self.simulator.history)
+        try:
+            return self.attack(self.heuristic, self.simulator.player, depth, allow_threes)
+        except SearchLimit:
+            while len(self.simulator.history) > history_length:
+                self.simulator.pop()
+            return None
+
+    def five_cells(self, color, cell):
+        # Empty cells that would make five in a row with the color stone on cell
+        board = self.simulator.bitboards[color]
+        other_board = self.simulator.bitboards[other_color(color)]
+        cells = set()
+        for mask in WINDOWS[cell[0]][cell[1]]:
+            if other_board & mask == 0 and bin(board & mask).count('1') == 4:
+                empty = mask & ~board
+                if empty:
+                    cells.add(bit_to_cell(empty))
+        return cells
+
+    def candidates(self, heuristic, color):
+        # Legal cells at most two steps past the end of a line of color, sorted
+        # to search in a fixed order. A four or a three always has a stone of
+        # the move's color within two cells of it along the line.
+        actions = self.simulator.actions
+        cells = set()
+        for dir in DIRS:
+            dx, dy = DIR_TO_DELTA[dir]
+            for open_end, lines in heuristic.open_end_dicts[dir][color].items():
+                if open_end in actions:
+                    cells.add(open_end)
+                for line in lines:
+                    if line.is_starting_end(*open_end):
+                        beyond = (open_end[0] - dx, open_end[1] - dy)
+                    else:
+                        beyond = (open_end[0] + dx, open_end[1] + dy)
+                    if beyond in actions:
+                        cells.add(beyond)
+        return sorted(cells)
+
+    def threats(self, heuristic, color):
+        # Moves of color sorted into fives and fours, with the five cells each
+        # four leaves
+        fives = []
+        fours = []
+        for cell in self.candidates(heuristic, color):
+            # Before the stone is on it, cell is the empty cell of a window it completes
+            if cell in self.five_cells(color, cell):
+                fives.append(cell)
+                continue
+
+            self.simulator.bitboards[color] |= cell_bit(*cell)
+            cells = self.five_cells(color, cell)
+            self.simulator.bitboards[color] &= ~cell_bit(*cell)
+            if len(cells) > 0:
+                fours.append((cell, cells))
+        return fives, fours
+
+    def play(self, heuristic, cell):
+        self.simulator.push(*cell)
+        new_heuristic = Heuristic.create_from_heuristic(heuristic, self.simulator)
+        new_heuristic.place(*cell)
+        return new_heuristic
+
+    def count_node(self):
+        self.num_nodes += 1
+        if self.num_nodes > self.max_nodes:
+            raise SearchLimit()
+        if self.num_nodes % TIME_CHECK_INTERVAL == 0 and time.time() > self.deadline:
+            raise SearchLimit()
+
+    def attack(self, heuristic, attacker, depth, allow_threes):
+        # Winning sequence for attacker, who is to move, or None
+        self.count_node()
+        defender = other_color(attacker)
+
+        fives, fours = self.threats(heuristic, attacker)
+        if len(fives) > 0:
+            return [fives[0]]
+
+        defender_fives, _ = self.threats(heuristic, defender)
+        if len(defender_fives) > 1 or depth == 0:
+            return None
+        if len(defender_fives) == 1:
+            # The attacker has to block, which only keeps the initiative if it is a four
+            fours = [(cell, cells) for cell, cells in fours if cell == defender_fives[0]]
+            allow_threes = False
+
+        for cell, cells in fours:
+            child = self.play(heuristic, cell)
+            five_cells = self.five_cells(attacker, cell)
+            if len(five_cells) > 1:
+                # An open four or a double four, only one of them can be blocked
+                self.simulator.pop()
+                return [cell]
+
+            block = five_cells.pop()
+            if self.simulator.game_over or block not in self.simulator.actions:
+                self.simulator.pop()
+                continue
+
+            sequence = self.attack(self.play(child, block), attacker, depth - 1, allow_threes)
+            self.simulator.pop()
+            self.simulator.pop()
+            if sequence is not None:
+                return [cell, block] + sequence
+
+        if not allow_threes:
+            return None
+
+        four_cells = set(cell for cell, cells in fours)
+        for cell in self.candidates(heuristic, attacker):
+            if cell in four_cells:
+                continue
+
+            child = self.play(heuristic, cell)
+            defences = self.three_defences(child, attacker)
+            if defences is not None and self.defend(child, attacker, defences, depth):
+                self.simulator.pop()
+                return [cell]
+            self.simulator.pop()
+
+        return None
+
+    def three_defences(self, heuristic, attacker):
+        # Replies that stop every open four attacker could make now, or None
+        # if attacker can't make one. A reply outside them leaves an open four.
+        defender = other_color(attacker)
+        defences = set()
+        _, fours = self.threats(heuristic, attacker)
+        for cell, cells in fours:
+            if len(cells) > 1:
+                defences.add(cell)
+                defences.update(cells)
+
+        if len(defences) == 0:
+            return None
+
+        # Making a four is also a reply, the attacker has to answer it
+        _, defender_fours = self.threats(heuristic, defender)
+        defences.update(cell for cell, cells in defender_fours)
+        return sorted(cell for cell in defences if cell in self.simulator.actions)
+
+    def defend(self, heuristic, attacker, defences, depth):
+        # Whether attacker still wins after each of the defender's replies
+        for cell in defences:
+            child = self.play(heuristic, cell)
+            won = not self.simulator.game_over and self.attack(child, attacker, depth - 1, True) is not None
+            self.simulator.pop()
+            if not won:
+                return False
+        return True
@@ -0,0 +1,47 @@
+from __future__ import absolute_import, division, print_function
+
+# Most nodes the table keeps, a node takes about 15KB with its heuristic
+TT_CAPACITY = 10000
+
+class TranspositionTable:
+    """Search nodes by the Zobrist hash of their position, so that every move
+    order reaching a position shares one node and its statistics.
+
+    The table holds at most capacity nodes. When it is full, the least
+    visited half is evicted: those nodes stay in the tree, they just stop
+    being shared with new transpositions.
+    """
+
+    def __init__(self, capacity=TT_CAPACITY):
+        self.capacity = capacity
+        self.nodes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        node = self.nodes.get(key)
+        if node is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return node
+
+    def put(self, key, node):
+        if len(self.nodes) >= self.capacity and key not in self.nodes:
+            self.evict()
+        self.nodes[key] = node
+
+    def evict(self):
+        # sorted() is stable, so among equally visited nodes the older ones stay
+        by_visits = sorted(self.nodes.items(), key=lambda item: item[1].num_visits, reverse=True)
+        keep = by_visits[:self.capacity // 2]
+        self.evictions += len(self.nodes) - len(keep)
+        self.nodes = dict(keep)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return '{} nodes, {} hits, {} misses, {} evictions'.format(
+            len(self.nodes), self.hits, self.misses, self.evictions)